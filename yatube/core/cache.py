@@ -0,0 +1,489 @@
+"""Бэкенды кеша, общие для всех процессов приложения.
+
+RespCache говорит с сервером по протоколу Redis (RESP) через сокет,
+TieredCache держит перед общим кешем короткий локальный кеш процесса.
+Все бэкенды защищают get_or_set от «набега» на пустой ключ
+и считают попадания и промахи для замеров запроса.
+"""
+import contextvars
+import os
+import pickle
+import socket
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends import filebased, locmem
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import timing
+from .metrics import registry
+
+_MISSING = object()
+# Глубина вложенных чтений из кеша в текущем потоке.
+_lookup_depth = contextvars.ContextVar('cache_lookup_depth', default=0)
+
+CACHE_KEYS = registry.counter(
+    'yatube_cache_keys_total', 'Прочитанные из кеша ключи: hit или miss.'
+)
+
+# incr() для RespCache: проверка и увеличение одним шагом на сервере.
+INCR_SCRIPT: str = (
+    "if redis.call('EXISTS', KEYS[1]) == 0 then return false end "
+    "return redis.call('INCRBY', KEYS[1], ARGV[1])"
+)
+
+
+class StampedeProtectionMixin:
+    """get_or_set, который вычисляет значение только в одном потоке.
+
+    Первый, кто не нашёл ключ, берёт блокировку через add(),
+    остальные ждут значение, а не считают его заново.
+    """
+    lock_timeout: int = 10
+    lock_poll: float = 0.05
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT,
+                   version=None):
+        value = self.get(key, version=version)
+        if value is not None:
+            return value
+        lock = f'{key}:lock'
+        if not self.add(lock, 1, self.lock_timeout, version=version):
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.lock_poll)
+                value = self.get(key, version=version)
+                if value is not None:
+                    return value
+                if not self.has_key(lock, version=version):
+                    break
+        try:
+            value = default() if callable(default) else default
+            if value is not None:
+                self.set(key, value, timeout, version=version)
+        finally:
+            self.delete(lock, version=version)
+        return value
+
+
+class CacheStatsMixin:
+    """Считает попадания и промахи: для замеров запроса (core.timing)
+    и в метрику yatube_cache_keys_total.
+
+    Вложенные чтения (общий кеш за локальным в TieredCache)
+    не считаются.
+    """
+
+    def _record(self, hits, keys):
+        if _lookup_depth.get():
+            return
+        timing.record_cache(hits, keys - hits)
+        CACHE_KEYS.inc(hits, backend=type(self).__name__, result='hit')
+        CACHE_KEYS.inc(
+            keys - hits, backend=type(self).__name__, result='miss'
+        )
+
+    def get(self, key, default=None, version=None):
+        token = _lookup_depth.set(_lookup_depth.get() + 1)
+        try:
+            value = super().get(key, _MISSING, version=version)
+        finally:
+            _lookup_depth.reset(token)
+        self._record(int(value is not _MISSING), 1)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        token = _lookup_depth.set(_lookup_depth.get() + 1)
+        try:
+            found = super().get_many(keys, version=version)
+        finally:
+            _lookup_depth.reset(token)
+        self._record(len(found), len(keys))
+        return found
+
+
+class LocMemCache(CacheStatsMixin, StampedeProtectionMixin,
+                  locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(CacheStatsMixin, StampedeProtectionMixin,
+                     filebased.FileBasedCache):
+    """Файловый кеш, общий для процессов на одной машине.
+
+    add() и incr() у Django — чтение, а затем запись, поэтому здесь
+    они выполняются под файлом-блокировкой ключа (O_CREAT | O_EXCL):
+    иначе счётчики лент расходятся, а блокировка get_or_set
+    достаётся сразу нескольким процессам. Блокировку, которую держат
+    дольше lock_timeout, считаем брошенной упавшим процессом.
+    """
+
+    @contextmanager
+    def _file_lock(self, fname):
+        lock = f'{fname}.lock'
+        self._createdir()
+        while True:
+            try:
+                os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                pass
+            try:
+                age = time.time() - os.path.getmtime(lock)
+                if age > self.lock_timeout:
+                    os.remove(lock)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(self.lock_poll)
+        try:
+            yield
+        finally:
+            try:
+                os.remove(lock)
+            except FileNotFoundError:
+                pass
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._file_lock(self._key_to_file(key, version)):
+            return super().add(key, value, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        fname = self._key_to_file(key, version)
+        with self._file_lock(fname):
+            try:
+                with open(fname, 'rb') as file:
+                    expires = pickle.load(file)
+                    value = pickle.loads(zlib.decompress(file.read()))
+            except FileNotFoundError:
+                expires = value = None
+            if value is None or (
+                expires is not None and expires < time.time()
+            ):
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            # Срок жизни остаётся прежним: счётчики лент бессрочные.
+            timeout = None if expires is None else expires - time.time()
+            self.set(key, value, timeout, version=version)
+        return value
+
+
+class RespError(Exception):
+    pass
+
+
+class RespConnection:
+    """Одно соединение с сервером, говорящим на RESP."""
+
+    def __init__(self, host, port, timeout):
+        self.timeout = timeout
+        self.sock = socket.create_connection((host, port), timeout)
+        self.reader = self.sock.makefile('rb')
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    @staticmethod
+    def encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('Сервер кеша закрыл соединение.')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RespError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            return [self.read_reply() for _ in range(int(rest))]
+        raise RespError(f'Непонятный ответ сервера: {line!r}')
+
+    def is_alive(self):
+        """Не закрыл ли сервер соединение — без запроса к нему."""
+        self.sock.setblocking(False)
+        try:
+            # Пока ответа не ждём, читать из сокета нечего: пустое
+            # чтение — сервер закрыл соединение, данные — мусор.
+            self.sock.recv(1, socket.MSG_PEEK)
+            return False
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        finally:
+            self.sock.settimeout(self.timeout)
+
+    def execute(self, *commands):
+        """Отправляет команды одним пакетом и читает все ответы."""
+        self.sock.sendall(b''.join(self.encode(args) for args in commands))
+        return [self.read_reply() for _ in commands]
+
+
+class RespCache(CacheStatsMixin, StampedeProtectionMixin, BaseCache):
+    """Общий кеш на сервере с протоколом Redis.
+
+    LOCATION — «host:port». Целые числа хранятся как есть, чтобы
+    incr() выполнялся на сервере, остальное — через pickle.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        host, _, port = server.rpartition(':')
+        self._address = (host or '127.0.0.1', int(port))
+        options = params.get('OPTIONS', {})
+        self._socket_timeout = options.get('SOCKET_TIMEOUT', 1)
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = RespConnection(*self._address, self._socket_timeout)
+            self._local.connection = connection
+        return connection
+
+    def _execute(self, *commands, retry=True):
+        """Выполняет команды. Команды, повтор которых меняет результат
+        (retry=False), после ошибки сокета не повторяются: сервер мог
+        успеть их выполнить."""
+        for attempt in range(2):
+            sent = False
+            try:
+                connection = self._connection()
+                if not retry and not connection.is_alive():
+                    self.close()
+                    connection = self._connection()
+                sent = True
+                return connection.execute(*commands)
+            except (OSError, ConnectionError):
+                self.close()
+                # Соединение могло устареть: пробуем ещё раз с новым.
+                if attempt or (sent and not retry):
+                    raise
+
+    def close(self, **kwargs):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    @staticmethod
+    def _dump(value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(data):
+        if data is None:
+            return None
+        try:
+            return int(data)
+        except ValueError:
+            return pickle.loads(data)
+
+    def _timeout_args(self, timeout):
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else (
+            timeout
+        )
+        if timeout is None:
+            return []
+        return ['PX', max(int(timeout * 1000), 1)]
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        reply, = self._execute(
+            ['SET', key, self._dump(value), 'NX',
+             *self._timeout_args(timeout)],
+            retry=False,
+        )
+        return reply == 'OK'
+
+    def get(self, key, default=None, version=None):
+        reply, = self._execute(['GET', self._key(key, version)])
+        value = self._load(reply)
+        return default if value is None else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout == 0:
+            self.delete(key, version=version)
+            return
+        self._execute(
+            ['SET', self._key(key, version), self._dump(value),
+             *self._timeout_args(timeout)]
+        )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        args = self._timeout_args(timeout)
+        command = ['PEXPIRE', key, args[1]] if args else ['PERSIST', key]
+        exists, _ = self._execute(['EXISTS', key], command)
+        return bool(exists)
+
+    def delete(self, key, version=None):
+        self._execute(['DEL', self._key(key, version)])
+
+    def has_key(self, key, version=None):
+        reply, = self._execute(['EXISTS', self._key(key, version)])
+        return bool(reply)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        reply, = self._execute(
+            ['MGET', *(self._key(key, version) for key in keys)]
+        )
+        return {
+            key: self._load(data)
+            for key, data in zip(keys, reply) if data is not None
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if data:
+            self._execute(*(
+                ['SET', self._key(key, version), self._dump(value),
+                 *self._timeout_args(timeout)]
+                for key, value in data.items()
+            ))
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._execute(['DEL', *keys])
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        value, = self._execute(
+            ['EVAL', INCR_SCRIPT, 1, key, delta], retry=False
+        )
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        return value
+
+    def clear(self):
+        self._execute(['FLUSHDB'])
+
+
+class TieredCache(CacheStatsMixin, StampedeProtectionMixin, BaseCache):
+    """Локальный кеш процесса (L1) перед общим кешем (L2).
+
+    LOCATION — имя общего кеша в CACHES. Значения живут в L1 не дольше
+    OPTIONS['LOCAL_TIMEOUT'] секунд, поэтому изменения из других
+    процессов становятся видны с этой задержкой. Потоки одного процесса
+    делят L1 с именем OPTIONS['LOCAL_LOCATION'].
+    """
+
+    def __init__(self, shared_alias, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = shared_alias
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 2)
+        self.local = locmem.LocMemCache(
+            options.get('LOCAL_LOCATION', f'tiered-{shared_alias}'), {
+                'OPTIONS': {
+                    'MAX_ENTRIES': options.get('LOCAL_MAX_ENTRIES', 1000),
+                },
+            }
+        )
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self.local.set(key, value, self._local_timeout(timeout),
+                           version=version)
+        return added
+
+    def get(self, key, default=None, version=None):
+        value = self.local.get(key, version=version)
+        if value is not None:
+            return value
+        value = self.shared.get(key, version=version)
+        if value is None:
+            return default
+        self.local.set(key, value, self.local_timeout, version=version)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self.local.set(key, value, self._local_timeout(timeout),
+                       version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(key, version=version)
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(key, version=version)
+        self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return (self.local.has_key(key, version=version)
+                or self.shared.has_key(key, version=version))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self.local.get_many(keys, version=version)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            self.local.set_many(shared, self.local_timeout, version=version)
+            found.update(shared)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self.local.set_many(data, self._local_timeout(timeout),
+                            version=version)
+        return failed
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.local.delete_many(keys, version=version)
+        self.shared.delete_many(keys, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # Счётчики живут только в общем кеше, иначе процессы разойдутся.
+        self.local.delete(key, version=version)
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,198 @@
+"""Отдача статики и медиафайлов самим приложением.
+
+Поддерживает условные запросы (ETag, Last-Modified), запросы
+диапазонов (Range) и заранее сжатые копии .br/.gz рядом с файлом.
+Ответ — FileResponse с настоящим файлом, поэтому WSGI-сервер
+с wsgi.file_wrapper (например, gunicorn) отдаёт его через sendfile.
+"""
+import mimetypes
+import os
+import re
+import stat
+from http import HTTPStatus
+
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.static import was_modified_since
+
+IMMUTABLE_MAX_AGE: int = 60 * 60 * 24 * 365
+MAX_AGE: int = 60 * 60
+# Имя содержит хеш содержимого: ManifestStaticFilesStorage
+# («app.3f2a1b9c8d7e.css»), картинки постов и миниатюры sorl.
+HASHED_NAME = re.compile(r'(^|[./])[0-9a-f]{12,64}(\.[^./]+)+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Кодировка -> расширение заранее сжатого файла, в порядке выбора.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class FileRange:
+    """Часть открытого файла для ответа 206.
+
+    fileno() ведёт к настоящему файлу, а позиция уже выставлена
+    на начало диапазона: gunicorn отдаёт такой файл через sendfile,
+    ограничившись Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def is_immutable(path):
+    return bool(HASHED_NAME.search(path))
+
+
+def etag_for(stat_result, suffix=''):
+    return f'"{int(stat_result.st_mtime):x}-{stat_result.st_size:x}{suffix}"'
+
+
+def not_modified(request, etag, stat_result):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags or f'W/{etag}' in etags
+    return not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'),
+        stat_result.st_mtime,
+        stat_result.st_size,
+    )
+
+
+def parse_range(request, size, etag, stat_result):
+    """(начало, длина) из заголовка Range, None — отдать файл целиком.
+
+    Несколько диапазонов сразу не поддерживаем: по RFC 7233 в этом
+    случае можно ответить всем файлом.
+    """
+    header = request.META.get('HTTP_RANGE')
+    if not header or request.method != 'GET':
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range not in (etag, http_date(stat_result.st_mtime)):
+        return None
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        return start, 0
+    return start, end - start + 1
+
+
+def choose_encoding(request, full_path):
+    """Заранее сжатая копия, которую принимает клиент, или None."""
+    accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    accepted = {
+        part.split(';')[0].strip() for part in accepted.split(',')
+    }
+    for encoding, extension in ENCODINGS:
+        if encoding in accepted and os.path.isfile(full_path + extension):
+            return encoding, full_path + extension
+    return None
+
+
+def precompressed_variant(request, full_path):
+    """(кодировка, путь) заранее сжатой копии или (None, full_path).
+
+    На запрос части файла отдаём исходный файл: диапазоны считаются
+    по его байтам.
+    """
+    if 'HTTP_RANGE' not in request.META:
+        chosen = choose_encoding(request, full_path)
+        if chosen:
+            return chosen
+    return None, full_path
+
+
+def file_response(request, full_path, content_type, etag, stat_result):
+    """Файл целиком или диапазон из заголовка Range."""
+    size = os.path.getsize(full_path)
+    byte_range = parse_range(request, size, etag, stat_result)
+    if byte_range and byte_range[1] == 0:
+        response = HttpResponse(
+            status=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range:
+        start, length = byte_range
+        response = FileResponse(
+            FileRange(open(full_path, 'rb'), start, length),
+            content_type=content_type,
+            status=HTTPStatus.PARTIAL_CONTENT,
+        )
+        response['Content-Length'] = length
+        response['Content-Range'] = (
+            f'bytes {start}-{start + length - 1}/{size}'
+        )
+        return response
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    response['Content-Length'] = size
+    return response
+
+
+def serve(request, path, document_root, precompressed=False):
+    """Отдаёт файл path из document_root."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponse(status=HTTPStatus.METHOD_NOT_ALLOWED)
+    try:
+        full_path = safe_join(document_root, path)
+        stat_result = os.stat(full_path)
+    except (ValueError, OSError):
+        raise Http404('Файл не найден.')
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('Файл не найден.')
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    encoding = None
+    if precompressed:
+        encoding, full_path = precompressed_variant(request, full_path)
+    etag = etag_for(stat_result, f'-{encoding}' if encoding else '')
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat_result.st_mtime),
+        'Cache-Control': (
+            f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+            if is_immutable(path) else f'public, max-age={MAX_AGE}'
+        ),
+        'Accept-Ranges': 'bytes',
+    }
+    if precompressed:
+        headers['Vary'] = 'Accept-Encoding'
+
+    if not_modified(request, etag, stat_result):
+        response = HttpResponse(status=HTTPStatus.NOT_MODIFIED)
+    else:
+        response = file_response(
+            request, full_path, content_type, etag, stat_result
+        )
+        if encoding:
+            response['Content-Encoding'] = encoding
+    for header, value in headers.items():
+        response[header] = value
+    return response
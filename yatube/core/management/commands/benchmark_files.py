@@ -0,0 +1,91 @@
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Post
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class Command(BaseCommand):
+    help = ('Измеряет пропускную способность отдачи статики и медиа '
+            'приложением: целиком, диапазоном, 304 и сжатой копией.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*',
+                            help='Пути файлов, по умолчанию — CSS '
+                                 'и картинка последнего поста.')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=8)
+
+    def default_paths(self):
+        paths = [staticfiles_storage.url('css/bootstrap.min.css')]
+        image = Post.objects.exclude(image='').order_by(
+            '-created'
+        ).values_list('image', flat=True).first()
+        if image:
+            paths.append(f'/media/{image}')
+        return paths
+
+    def handle(self, *args, **options):
+        server = make_server('127.0.0.1', 0, WSGIHandler(),
+                             server_class=ThreadingServer,
+                             handler_class=QuietHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        base = 'http://127.0.0.1:{}'.format(server.server_port)
+        try:
+            for path in options['paths'] or self.default_paths():
+                self.benchmark(base + path, options)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def fetch(self, url, headers):
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, len(response.read()), response.headers
+        except urllib.error.HTTPError as error:
+            return error.code, 0, error.headers
+
+    def benchmark(self, url, options):
+        status, _, headers = self.fetch(url, {})
+        if status != 200:
+            raise CommandError(f'{url}: ответ {status}.')
+        scenarios = (
+            ('целиком', {}),
+            ('gzip', {'Accept-Encoding': 'gzip'}),
+            ('диапазон 1 КБ', {'Range': 'bytes=0-1023'}),
+            ('304', {'If-None-Match': headers['ETag']}),
+        )
+        self.stdout.write(url)
+        for title, request_headers in scenarios:
+            total = options['requests']
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                results = list(pool.map(
+                    lambda _: self.fetch(url, request_headers), range(total)
+                ))
+            elapsed = time.perf_counter() - started
+            received = sum(size for _, size, _ in results)
+            statuses = sorted({status for status, _, _ in results})
+            self.stdout.write(
+                f'  {title:<14} {total / elapsed:>8.0f} запр/с '
+                f'{received / elapsed / 1024 / 1024:>8.1f} МБ/с '
+                f'статусы {statuses}'
+            )
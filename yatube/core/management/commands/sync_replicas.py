@@ -0,0 +1,43 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = ('Копирует БД default в файлы реплик-стендов SQLite: '
+            'так реплики догоняют основную БД.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'aliases', nargs='*',
+            help='Алиасы реплик, по умолчанию — все из DATABASES, '
+                 'кроме default.',
+        )
+
+    def handle(self, *args, **options):
+        databases = settings.DATABASES
+        aliases = options['aliases'] or [
+            alias for alias in databases if alias != DEFAULT_DB_ALIAS
+        ]
+        for alias in [DEFAULT_DB_ALIAS, *aliases]:
+            if alias not in databases:
+                raise CommandError(f'Нет БД {alias} в DATABASES.')
+            if not databases[alias]['ENGINE'].endswith('sqlite3'):
+                raise CommandError(
+                    f'{alias}: копировать умеем только SQLite.'
+                )
+        source = sqlite3.connect(databases[DEFAULT_DB_ALIAS]['NAME'])
+        try:
+            for alias in aliases:
+                # backup() даёт целостный снимок даже во время записи.
+                target = sqlite3.connect(databases[alias]['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f'{alias}: {databases[alias]["NAME"]}')
+        finally:
+            source.close()
+        self.stdout.write(self.style.SUCCESS('Реплики обновлены.'))
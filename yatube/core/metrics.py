@@ -0,0 +1,315 @@
+"""Метрики приложения в текстовом формате Prometheus.
+
+Счётчики, гауги и гистограммы живут в памяти процесса. Если задан
+settings.METRICS_DIR, каждый процесс раз в METRICS_FLUSH_SECONDS
+сбрасывает туда снимок своих значений, а /metrics/ складывает снимки
+всех процессов: так метрики не зависят от того, какой воркер ответил.
+Значения гауг берутся только у живых процессов. Каталог стоит
+очищать при каждом запуске сервера.
+
+Метки передаются именованными аргументами:
+histogram.observe(0.25, view='posts:index').
+"""
+import atexit
+import glob
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+# Границы корзин для длительностей в секундах.
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+# Границы корзин для числа запросов к БД.
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _labels(labels, **extra):
+    labels = {**dict(labels), **extra}
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"'),
+        )
+        for name, value in sorted(labels.items())
+    )
+    return '{' + pairs + '}'
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Metric:
+    kind = ''
+    # Брать значения только у живых процессов.
+    live_only = False
+
+    def __init__(self, name, documentation, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.registry = registry
+        # Метки -> значение.
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _update(self, labels, update):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = update(self.values.get(key))
+        if self.registry is not None:
+            self.registry.changed()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+    def reset(self):
+        with self.lock:
+            self.values = {}
+
+    def merge(self, snapshots):
+        """Значения из снимков нескольких процессов."""
+        merged = {}
+        for values in snapshots:
+            for key, value in values.items():
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def samples(self, values):
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_labels(labels)} {_number(value)}'
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self._update(labels, lambda value: (value or 0) + amount)
+
+
+class Gauge(Metric):
+    """Текущее значение. mode — как складывать процессы:
+    sum, max или min."""
+    kind = 'gauge'
+    live_only = True
+
+    def __init__(self, name, documentation, registry=None, mode='sum'):
+        super().__init__(name, documentation, registry)
+        self.mode = mode
+
+    def set(self, value, **labels):
+        self._update(labels, lambda _: value)
+
+    def inc(self, amount=1, **labels):
+        self._update(labels, lambda value: (value or 0) + amount)
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def merge(self, snapshots):
+        if self.mode == 'sum':
+            return super().merge(snapshots)
+        pick = max if self.mode == 'max' else min
+        merged = {}
+        for values in snapshots:
+            for key, value in values.items():
+                merged[key] = pick(merged[key], value) if (
+                    key in merged
+                ) else value
+        return merged
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, registry=None,
+                 buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        def update(row):
+            # [число в каждой корзине..., сумма, всего]
+            row = list(row or [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+            return row
+        self._update(labels, update)
+
+    def merge(self, snapshots):
+        merged = {}
+        for values in snapshots:
+            for key, row in values.items():
+                if len(row) != len(self.buckets) + 2:
+                    # Снимок процесса с другими корзинами.
+                    continue
+                if key in merged:
+                    row = [a + b for a, b in zip(merged[key], row)]
+                merged[key] = row
+        return merged
+
+    def samples(self, values):
+        for labels, row in sorted(values.items()):
+            total = 0
+            for bound, count in zip(self.buckets, row):
+                total += count
+                yield (f'{self.name}_bucket'
+                       f'{_labels(labels, le=_number(bound))} {total}')
+            yield f'{self.name}_bucket{_labels(labels, le="+Inf")} {row[-1]}'
+            yield f'{self.name}_sum{_labels(labels)} {_number(row[-2])}'
+            yield f'{self.name}_count{_labels(labels)} {row[-1]}'
+
+
+class Registry:
+    """Метрики процесса и их снимки в общем каталоге.
+
+    directory по умолчанию берётся из settings.METRICS_DIR; пустой
+    каталог — метрики только этого процесса.
+    """
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        # Снимок нового процесса не должен затереть чужой с тем же pid.
+        self.pid = os.getpid()
+        self.filename = f'{self.pid}-{uuid.uuid4().hex}.pickle'
+        self.dirty = False
+        self.flusher = None
+
+    @property
+    def directory(self):
+        if self._directory is not None:
+            return self._directory
+        return settings.METRICS_DIR
+
+    def _get(self, metric_class, name, *args, **kwargs):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = metric_class(
+                    name, *args, registry=self, **kwargs
+                )
+            return self.metrics[name]
+
+    def counter(self, name, documentation):
+        return self._get(Counter, name, documentation)
+
+    def gauge(self, name, documentation, mode='sum'):
+        return self._get(Gauge, name, documentation, mode=mode)
+
+    def histogram(self, name, documentation, buckets=DURATION_BUCKETS):
+        return self._get(Histogram, name, documentation, buckets=buckets)
+
+    def changed(self):
+        self.dirty = True
+        if self.flusher is None and self.directory:
+            with self.lock:
+                if self.flusher is None:
+                    self.flusher = threading.Thread(
+                        target=self._flush_periodically, daemon=True
+                    )
+                    self.flusher.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_SECONDS)
+            if not self.directory:
+                return
+            if self.dirty:
+                self.flush()
+
+    def snapshot(self):
+        return {
+            name: metric.snapshot() for name, metric in self.metrics.items()
+        }
+
+    def flush(self):
+        """Сохраняет снимок процесса в каталог метрик."""
+        directory = self.directory
+        if not directory:
+            return
+        self.dirty = False
+        data = pickle.dumps({'pid': self.pid, 'metrics': self.snapshot()})
+        os.makedirs(directory, exist_ok=True)
+        # Пишем во временный файл и подменяем: читатель не увидит
+        # наполовину записанный снимок.
+        handle, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as file:
+            file.write(data)
+        os.replace(path, os.path.join(directory, self.filename))
+
+    def collect(self):
+        """Снимки всех процессов: имя метрики -> список значений."""
+        directory = self.directory
+        if not directory:
+            return {
+                name: [values] for name, values in self.snapshot().items()
+            }
+        self.flush()
+        collected = {}
+        for path in glob.glob(os.path.join(directory, '*.pickle')):
+            try:
+                with open(path, 'rb') as file:
+                    data = pickle.load(file)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                continue
+            alive = _alive(data['pid'])
+            for name, values in data['metrics'].items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.live_only and not alive):
+                    continue
+                collected.setdefault(name, []).append(values)
+        return collected
+
+    def render(self):
+        collected = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            values = metric.merge(collected.get(name, []))
+            lines.extend(metric.samples(values))
+        return '\n'.join(lines) + '\n'
+
+    def after_fork(self):
+        """В дочернем процессе значения родителя не наши."""
+        # Блокировки могли остаться занятыми потоками родителя.
+        self.lock = threading.Lock()
+        for metric in self.metrics.values():
+            metric.lock = threading.Lock()
+            metric.reset()
+        self._start()
+
+    def close(self):
+        if self.dirty:
+            self.flush()
+
+
+registry = Registry()
+os.register_at_fork(after_in_child=registry.after_fork)
+atexit.register(registry.close)
@@ -1,9 +1,24 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, router, transaction
 
 User = get_user_model()
 
 
+class AtomicSaveMixin:
+    """Сохраняет строку в одной транзакции с обработчиками post_save.
+
+    Если обработчик упадёт, строка тоже не сохранится. Удаление
+    Django и так проводит в транзакции вместе с post_delete.
+    """
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+
 class CreatedModel(models.Model):
     """Абстрактная модель. Добавляет дату создания."""
     created = models.DateTimeField(
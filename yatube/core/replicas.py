@@ -0,0 +1,107 @@
+"""Чтение из реплик БД.
+
+Представления, помеченные replica_reads, читают из случайной реплики
+из settings.DATABASE_REPLICAS, остальные запросы и все записи идут
+в default. После записи (sticky_primary) пользователь ещё
+REPLICA_STICKY_SECONDS читает из default, чтобы сразу увидеть своё,
+пока реплики догоняют: это помнит cookie. Так же страница, данные
+которой менялись в этом окне, читается из default — иначе отставшая
+реплика попала бы в кеш страниц под новой версией (use_primary).
+"""
+import contextvars
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE: str = 'primary_reads'
+
+# Алиас реплики для чтения в текущем запросе или None — default.
+_replica = contextvars.ContextVar('replica', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if replica is None and settings.DATABASE_REPLICAS:
+            # И связанные объекты того, что прочитали из реплики
+            # до use_primary().
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        # Объект, прочитанный из реплики, сохраняется в default.
+        # Без реплик решает Django: например, migrate --database.
+        if settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default: связи между ними допустимы.
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def current():
+    """Реплика, из которой сейчас читаем, или None."""
+    return _replica.get()
+
+
+def use_primary():
+    """До конца запроса читать из default."""
+    _replica.set(None)
+
+
+def use_primary_if_changed(modified):
+    """Читать из default, если данные менялись позже, чем реплики
+    могли их получить. modified — datetime изменения."""
+    if (
+        _replica.get() is not None
+        and time.time() - modified.timestamp()
+        < settings.REPLICA_STICKY_SECONDS
+    ):
+        use_primary()
+
+
+def replica_reads(view):
+    """Декоратор представления: GET и HEAD читают из реплики."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (
+            not settings.DATABASE_REPLICAS
+            or request.method not in ('GET', 'HEAD')
+            or STICKY_COOKIE in request.COOKIES
+        ):
+            return view(request, *args, **kwargs)
+        if hasattr(request, 'user'):
+            # Сессию и пользователя читаем из default: только что
+            # вошедшего пользователя в реплике может ещё не быть.
+            request.user.is_authenticated
+        token = _replica.set(random.choice(settings.DATABASE_REPLICAS))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+    return wrapper
+
+
+def sticky_primary(view):
+    """Декоратор пишущего представления: после удачной записи
+    (ответ-перенаправление) читать из default ещё
+    REPLICA_STICKY_SECONDS."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if settings.DATABASE_REPLICAS and 300 <= response.status_code < 400:
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+    return wrapper
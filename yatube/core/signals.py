@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """PRAGMA из settings.SQLITE_PRAGMAS для каждого нового соединения.
+
+    Выполняются мимо курсоров Django, чтобы не попадать в замеры
+    и подсчёты запросов.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    execute = connection.connection.execute
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        if name == 'journal_mode':
+            # Режим журнала хранится в файле БД, а его смена ждёт
+            # монопольной блокировки: без нужды не меняем.
+            current, = execute('PRAGMA journal_mode').fetchone()
+            if current == value:
+                continue
+        execute(f'PRAGMA {name} = {value}')
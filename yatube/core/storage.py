@@ -0,0 +1,132 @@
+"""Хранилища файлов проекта."""
+import gzip
+import hashlib
+import os
+import tempfile
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TEMP_PREFIX: str = '.upload-'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит каждый файл один раз под SHA-256 его содержимого.
+
+    Загрузка пишется во временный файл и одновременно хешируется,
+    затем переименовывается в «<каталог>/<sha256><расширение>».
+    Если такой файл уже есть, временный просто удаляется, а у файла
+    обновляется время изменения: одинаковые загрузки получают одно
+    имя, а значит, и общие миниатюры.
+    Файлы никогда не перезаписываются и не удаляются при удалении
+    записей — осиротевшие убирает команда gc_media.
+    """
+    hash_name: str = 'sha256'
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя зависит только от содержимого.
+        return name
+
+    def content_name(self, name, digest):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, f'{digest}{extension}')
+
+    def name_for(self, name, content):
+        """Имя, под которым сохранится content, без сохранения."""
+        digest = hashlib.new(self.hash_name)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        return self.content_name(name, digest.hexdigest()).replace('\\', '/')
+
+    def _save(self, name, content):
+        directory = os.path.dirname(self.path(name))
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.new(self.hash_name)
+        handle, temp_path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            name = self.content_name(name, digest.hexdigest())
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.remove(temp_path)
+                # Свежее время изменения: gc_media не удалит файл,
+                # который только что снова понадобился.
+                os.utime(full_path)
+            else:
+                # mkstemp создаёт файл с правами 0600.
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name.replace('\\', '/')
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем в имени и заранее сжатыми копиями.
+
+    После collectstatic рядом с каждым текстовым файлом лежат .gz
+    и, если установлен пакет brotli, .br — core.files отдаёт их без
+    сжатия на лету. Если файла нет в манифесте (collectstatic ещё
+    не запускали), url() возвращает обычное имя, а не падает.
+    """
+    manifest_strict = False
+    compress_extensions = (
+        '.css', '.js', '.svg', '.txt', '.html', '.json', '.xml', '.ico',
+    )
+    # Сжатая копия нужна, только если она заметно меньше.
+    min_ratio = 0.95
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        # CSS обрабатывается в несколько проходов, сжимаем только
+        # итоговые имена.
+        final = {}
+        processed = super().post_process(paths, dry_run, **options)
+        for name, hashed_name, done in processed:
+            yield name, hashed_name, done
+            if done and not isinstance(done, Exception):
+                final[name] = hashed_name
+        if dry_run:
+            return
+        for name, hashed_name in final.items():
+            if hashed_name.endswith(self.compress_extensions):
+                for compressed in self.compress(hashed_name):
+                    yield name, compressed, True
+
+    def compress(self, name):
+        """Пишет сжатые копии файла name, возвращает их имена."""
+        with self.open(name) as file:
+            data = file.read()
+        compressors = [('.gz', lambda data: gzip.compress(data, 9))]
+        if brotli is not None:
+            compressors.append(('.br', brotli.compress))
+        written = []
+        for extension, compress in compressors:
+            compressed = compress(data)
+            if len(compressed) > len(data) * self.min_ratio:
+                continue
+            path = self.path(name + extension)
+            with open(path, 'wb') as file:
+                file.write(compressed)
+            written.append(name + extension)
+        return written
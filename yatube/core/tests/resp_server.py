@@ -0,0 +1,171 @@
+"""Маленький сервер с протоколом Redis для тестов кеша.
+
+Понимает только команды, которые нужны RespCache, и считает
+попадания и промахи GET/MGET.
+"""
+import socketserver
+import threading
+import time
+
+from core.cache import INCR_SCRIPT
+
+
+class Store:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _read(self, key):
+        if self._alive(key):
+            self.hits += 1
+            return self.data[key]
+        self.misses += 1
+        return None
+
+    def _expire(self, key, ms):
+        if ms is None:
+            self.expires.pop(key, None)
+        else:
+            self.expires[key] = time.monotonic() + ms / 1000
+
+    def execute(self, name, *args):
+        with self.lock:
+            return getattr(self, f'cmd_{name.lower()}')(*args)
+
+    def cmd_ping(self):
+        return 'PONG'
+
+    def cmd_get(self, key):
+        return self._read(key)
+
+    def cmd_mget(self, *keys):
+        return [self._read(key) for key in keys]
+
+    def cmd_set(self, key, value, *options):
+        options = [option.decode().upper() for option in options]
+        if 'NX' in options and self._alive(key):
+            return None
+        ms = None
+        if 'PX' in options:
+            ms = int(options[options.index('PX') + 1])
+        elif 'EX' in options:
+            ms = int(options[options.index('EX') + 1]) * 1000
+        self.data[key] = value
+        self._expire(key, ms)
+        return 'OK'
+
+    def cmd_del(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self._alive(key):
+                deleted += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return deleted
+
+    def cmd_exists(self, *keys):
+        return sum(self._alive(key) for key in keys)
+
+    def cmd_incrby(self, key, delta):
+        value = int(self.data[key]) if self._alive(key) else 0
+        value += int(delta)
+        self.data[key] = str(value).encode()
+        return value
+
+    def cmd_eval(self, script, numkeys, *args):
+        # Lua не исполняем: узнаём единственный скрипт RespCache.
+        if script.decode() != INCR_SCRIPT:
+            raise ValueError('unknown script')
+        key, delta = args
+        if not self._alive(key):
+            return None
+        return self.cmd_incrby(key, delta)
+
+    def cmd_pexpire(self, key, ms):
+        if not self._alive(key):
+            return 0
+        self._expire(key, int(ms))
+        return 1
+
+    def cmd_persist(self, key):
+        if not self._alive(key) or key not in self.expires:
+            return 0
+        self._expire(key, None)
+        return 1
+
+    def cmd_flushdb(self):
+        self.data.clear()
+        self.expires.clear()
+        return 'OK'
+
+
+def encode(reply):
+    if reply is None:
+        return b'$-1\r\n'
+    if isinstance(reply, str):
+        return f'+{reply}\r\n'.encode()
+    if isinstance(reply, int):
+        return b':%d\r\n' % reply
+    if isinstance(reply, bytes):
+        return b'$%d\r\n%s\r\n' % (len(reply), reply)
+    if isinstance(reply, Exception):
+        return f'-ERR {reply}\r\n'.encode()
+    return b'*%d\r\n' % len(reply) + b''.join(encode(item) for item in reply)
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            name, *args = args
+            try:
+                reply = self.server.store.execute(name.decode(), *args)
+            except (AttributeError, KeyError, ValueError) as error:
+                reply = error
+            self.wfile.write(encode(reply))
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    """Сервер в отдельном потоке на свободном порту 127.0.0.1."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RespHandler)
+        self.store = Store()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def location(self):
+        host, port = self.server_address
+        return f'{host}:{port}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
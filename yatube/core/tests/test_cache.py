@@ -0,0 +1,222 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import FileBasedCache, RespCache, TieredCache
+from core.tests.resp_server import RespServer
+
+
+class RespCacheTest(SimpleTestCase):
+    """Общий кеш на локальном сервере вместо Redis."""
+
+    def setUp(self):
+        self.server = RespServer().start()
+        self.workers = [self.worker() for _ in range(2)]
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.close()
+        self.server.stop()
+
+    def worker(self):
+        """Отдельный экземпляр бэкенда — как в другом процессе."""
+        return RespCache(self.server.location, {})
+
+    def test_workers_share_values(self):
+        """Значение, записанное одним процессом, видно другому."""
+        first, second = self.workers
+        first.set('post', {'text': 'Тест'})
+        first.set_many({'a': 1, 'b': 'два'})
+        self.assertEqual(second.get('post'), {'text': 'Тест'})
+        self.assertEqual(second.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 'два'})
+        second.delete('post')
+        self.assertIsNone(first.get('post'))
+
+    def test_hit_rate_holds_across_workers(self):
+        """Значение считается один раз на ключ, а не на процесс."""
+        computed = []
+
+        def compute(key):
+            computed.append(key)
+            return len(key)
+
+        for request in range(100):
+            worker = self.workers[request % 2]
+            key = f'feed:{request % 10}'
+            worker.get_or_set(key, lambda: compute(key), timeout=None)
+        self.assertEqual(len(computed), 10)
+        store = self.server.store
+        self.assertGreaterEqual(store.hits / (store.hits + store.misses), 0.9)
+
+    def test_incr_and_add(self):
+        first, second = self.workers
+        with self.assertRaises(ValueError):
+            first.incr('missing')
+        first.set('counter', 5, timeout=None)
+        self.assertEqual(second.incr('counter', 2), 7)
+        self.assertEqual(first.decr('counter'), 6)
+        self.assertFalse(second.add('counter', 1))
+        self.assertTrue(second.add('new', 1))
+
+    def test_incr_reconnects_before_sending(self):
+        """Оборванное соединение замечается до INCRBY, а не после."""
+        first, second = self.workers
+        first.set('counter', 1, timeout=None)
+        first._connection().sock.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(first.incr('counter'), 2)
+        self.assertEqual(second.get('counter'), 2)
+
+    def test_timeouts(self):
+        first, second = self.workers
+        first.set('short', 'значение', timeout=0.05)
+        first.set('long', 'значение', timeout=None)
+        time.sleep(0.1)
+        self.assertIsNone(second.get('short'))
+        self.assertTrue(second.touch('long', 0.05))
+        self.assertFalse(second.touch('short'))
+        time.sleep(0.1)
+        self.assertFalse(first.has_key('long'))
+
+    def test_get_or_set_computes_once(self):
+        """Пустой ключ считает один процесс, остальные ждут его."""
+        computed = []
+        barrier = threading.Barrier(8)
+        results = []
+
+        def compute():
+            computed.append(1)
+            time.sleep(0.2)
+            return 42
+
+        def request():
+            worker = self.worker()
+            barrier.wait()
+            results.append(worker.get_or_set('slow', compute))
+            worker.close()
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(computed), 1)
+        self.assertEqual(results, [42] * 8)
+
+
+class FileBasedCacheTest(SimpleTestCase):
+    """Файловый кеш, который делят процессы."""
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.cache = FileBasedCache(self.location, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.location, ignore_errors=True)
+
+    def in_processes(self, count, work):
+        pids = []
+        for _ in range(count):
+            pid = os.fork()
+            if not pid:
+                try:
+                    work(FileBasedCache(self.location, {}))
+                finally:
+                    os._exit(0)
+            pids.append(pid)
+        for pid in pids:
+            os.waitpid(pid, 0)
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0, timeout=None)
+
+        def work(cache):
+            for _ in range(50):
+                cache.incr('counter')
+
+        self.in_processes(4, work)
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_add_excludes_other_processes(self):
+        def work(cache):
+            if cache.add('lock', 1):
+                cache.incr('winners')
+
+        self.cache.set('winners', 0, timeout=None)
+        self.in_processes(4, work)
+        self.assertEqual(self.cache.get('winners'), 1)
+
+    def test_incr_keeps_timeout(self):
+        self.cache.set('short', 1, timeout=0.2)
+        self.assertEqual(self.cache.incr('short'), 2)
+        time.sleep(0.3)
+        self.assertIsNone(self.cache.get('short'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('short')
+
+
+class TieredCacheTest(SimpleTestCase):
+    """Локальный кеш процесса перед общим сервером."""
+
+    def setUp(self):
+        self.server = RespServer().start()
+        self.settings_override = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'core.cache.LocMemCache',
+            },
+            'shared': {
+                'BACKEND': 'core.cache.RespCache',
+                'LOCATION': self.server.location,
+            },
+        })
+        self.settings_override.enable()
+        self.workers = [
+            TieredCache('shared', {'OPTIONS': {
+                'LOCAL_TIMEOUT': 0.2,
+                'LOCAL_LOCATION': f'worker-{number}',
+            }})
+            for number in range(2)
+        ]
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.close()
+        self.settings_override.disable()
+        self.server.stop()
+
+    def test_local_hits_skip_server(self):
+        first, second = self.workers
+        first.set('key', 'значение')
+        second.get('key')
+        requests = self.server.store.hits + self.server.store.misses
+        for _ in range(10):
+            self.assertEqual(first.get('key'), 'значение')
+            self.assertEqual(second.get_many(['key']), {'key': 'значение'})
+        self.assertEqual(
+            self.server.store.hits + self.server.store.misses, requests
+        )
+
+    def test_other_worker_changes_visible_after_local_timeout(self):
+        first, second = self.workers
+        first.set('key', 'старое')
+        self.assertEqual(second.get('key'), 'старое')
+        first.set('key', 'новое')
+        self.assertEqual(second.get('key'), 'старое')
+        time.sleep(0.3)
+        self.assertEqual(second.get('key'), 'новое')
+
+    def test_incr_goes_to_shared(self):
+        first, second = self.workers
+        first.set('counter', 1, timeout=None)
+        self.assertEqual(second.get('counter'), 1)
+        self.assertEqual(first.incr('counter'), 2)
+        self.assertEqual(second.incr('counter'), 3)
+        self.assertEqual(first.get('counter'), 3)
+        first.delete('counter')
+        with self.assertRaises(ValueError):
+            second.incr('counter')
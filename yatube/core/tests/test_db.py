@@ -0,0 +1,28 @@
+from django.db import connections
+from django.test import TestCase, override_settings
+
+
+class SqlitePragmasTest(TestCase):
+    # Тестовая БД default живёт в памяти, реплика — в файле.
+    databases = {'replica1'}
+
+    def pragma(self, name):
+        # Новое соединение: текущее держит транзакцию теста.
+        connection = connections['replica1'].copy()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA {name}')
+                return cursor.fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_pragmas(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        # NORMAL
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 100})
+    def test_from_settings(self):
+        self.assertEqual(self.pragma('busy_timeout'), 100)
@@ -0,0 +1,150 @@
+import gzip
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+from io import StringIO
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+MEDIA_ROOT = tempfile.mkdtemp()
+STATIC_ROOT = tempfile.mkdtemp()
+CONTENT = b'0123456789' * 10
+HASHED_NAME = 'posts/' + 'a' * 64 + '.gif'
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, STATIC_ROOT=STATIC_ROOT)
+class FileServingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(MEDIA_ROOT, 'posts'), exist_ok=True)
+        for name in ('posts/plain.gif', HASHED_NAME):
+            with open(os.path.join(MEDIA_ROOT, name), 'wb') as file:
+                file.write(CONTENT)
+        os.makedirs(os.path.join(STATIC_ROOT, 'css'), exist_ok=True)
+        with open(os.path.join(STATIC_ROOT, 'css/app.css'), 'wb') as file:
+            file.write(b'body{}' * 100)
+        with open(os.path.join(STATIC_ROOT, 'css/app.css.gz'), 'wb') as file:
+            file.write(gzip.compress(b'body{}' * 100))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(STATIC_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        body = b''.join(response.streaming_content) if (
+            response.streaming
+        ) else response.content
+        return response, body
+
+    def test_media_file(self):
+        response, body = self.get('/media/posts/plain.gif')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(body, CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_hashed_names_are_immutable(self):
+        response, _ = self.get(f'/media/{HASHED_NAME}')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_conditional_get(self):
+        response, _ = self.get('/media/posts/plain.gif')
+        for header, value in (
+            ('HTTP_IF_NONE_MATCH', response['ETag']),
+            ('HTTP_IF_MODIFIED_SINCE', response['Last-Modified']),
+        ):
+            with self.subTest(header=header):
+                response, body = self.get(
+                    '/media/posts/plain.gif', **{header: value}
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                self.assertEqual(body, b'')
+
+    def test_range_requests(self):
+        url = '/media/posts/plain.gif'
+        size = len(CONTENT)
+        etag = self.get(url)[0]['ETag']
+        # (заголовки, статус, тело)
+        cases = (
+            ({'HTTP_RANGE': 'bytes=2-5'}, HTTPStatus.PARTIAL_CONTENT,
+             CONTENT[2:6]),
+            ({'HTTP_RANGE': 'bytes=95-'}, HTTPStatus.PARTIAL_CONTENT,
+             CONTENT[95:]),
+            ({'HTTP_RANGE': 'bytes=-3'}, HTTPStatus.PARTIAL_CONTENT,
+             CONTENT[-3:]),
+            ({'HTTP_RANGE': f'bytes={size}-'},
+             HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, b''),
+            ({'HTTP_RANGE': 'bytes=2-5', 'HTTP_IF_RANGE': etag},
+             HTTPStatus.PARTIAL_CONTENT, CONTENT[2:6]),
+            ({'HTTP_RANGE': 'bytes=2-5', 'HTTP_IF_RANGE': '"old"'},
+             HTTPStatus.OK, CONTENT),
+            ({'HTTP_RANGE': 'bytes=0-1,4-5'}, HTTPStatus.OK, CONTENT),
+        )
+        for headers, status, content in cases:
+            with self.subTest(headers=headers):
+                response, body = self.get(url, **headers)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(body, content)
+        response, _ = self.get(url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response['Content-Range'], f'bytes 2-5/{size}')
+        self.assertEqual(response['Content-Length'], '4')
+
+    def test_missing_and_outside_files(self):
+        for url in ('/media/posts/missing.gif', '/media/posts/'):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.client.get(url).status_code, HTTPStatus.NOT_FOUND
+                )
+        self.assertEqual(
+            self.client.get('/media/../manage.py').status_code,
+            HTTPStatus.BAD_REQUEST,
+        )
+
+    def test_precompressed_static(self):
+        url = '/static/css/app.css'
+        response, body = self.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(body), b'body{}' * 100)
+        response, body = self.get(url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(body, b'body{}' * 100)
+
+
+class CompressedManifestStorageTest(TestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root, True)
+
+    def test_url_without_manifest(self):
+        """Без collectstatic ссылки на статику не ломаются."""
+        with override_settings(STATIC_ROOT=self.static_root):
+            self.assertEqual(
+                staticfiles_storage.url('css/bootstrap.min.css'),
+                '/static/css/bootstrap.min.css',
+            )
+
+    def test_collectstatic_hashes_and_compresses(self):
+        with override_settings(STATIC_ROOT=self.static_root):
+            call_command('collectstatic', interactive=False, verbosity=0,
+                         stdout=StringIO())
+            url = staticfiles_storage.url('css/bootstrap.min.css')
+        self.assertRegex(
+            url, r'^/static/css/bootstrap\.min\.[0-9a-f]{12}\.css$'
+        )
+        path = os.path.join(self.static_root, url[len('/static/'):])
+        self.assertTrue(os.path.isfile(path + '.gz'))
+        with open(path, 'rb') as original, open(path + '.gz', 'rb') as gz:
+            self.assertEqual(gzip.decompress(gz.read()), original.read())
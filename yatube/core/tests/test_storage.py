@@ -0,0 +1,47 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.location, ignore_errors=True)
+
+    def test_name_is_content_digest(self):
+        content = b'GIF89a-test'
+        name = self.storage.save('posts/Small.GIF', ContentFile(content))
+        self.assertEqual(
+            name, f'posts/{hashlib.sha256(content).hexdigest()}.gif'
+        )
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), content)
+        self.assertEqual(
+            self.storage.name_for('posts/other.gif', ContentFile(content)),
+            name,
+        )
+
+    def test_duplicates_stored_once(self):
+        first = self.storage.save('posts/a.gif', ContentFile(b'same'))
+        second = self.storage.save('posts/b.gif', ContentFile(b'same'))
+        other = self.storage.save('posts/c.gif', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        _, files = self.storage.listdir('posts')
+        self.assertEqual(len(files), 2)
+
+    def test_duplicate_refreshes_mtime(self):
+        name = self.storage.save('posts/a.gif', ContentFile(b'same'))
+        path = self.storage.path(name)
+        os.utime(path, (0, 0))
+        self.storage.save('posts/b.gif', ContentFile(b'same'))
+        self.assertGreater(os.path.getmtime(path), 0)
@@ -0,0 +1,103 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import Registry
+
+
+def timings(response):
+    """Значения Server-Timing: имя -> {параметр: значение}."""
+    found = {}
+    for metric in response['Server-Timing'].split(', '):
+        name, *params = metric.split(';')
+        found[name] = dict(param.split('=', 1) for param in params)
+    return found
+
+
+class TimingMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('posts:index'))
+        first = timings(response)
+        self.assertEqual(set(first), {'db', 'tpl', 'cache', 'total'})
+        self.assertGreater(float(first['tpl']['dur']), 0)
+        self.assertRegex(first['db']['desc'], r'^"[1-9]\d* queries"$')
+        # Гостю страница отдаётся из кеша без шаблонов и запросов.
+        second = timings(self.client.get(reverse('posts:index')))
+        self.assertEqual(second['db']['desc'], '"0 queries"')
+        self.assertEqual(float(second['tpl']['dur']), 0)
+        hits = re.search(r'hits=(\d+)', second['cache']['desc'])
+        self.assertGreater(int(hits.group(1)), 0)
+
+    @override_settings(REQUEST_TIMING_SLOW_MS=0)
+    def test_slow_request_logged(self):
+        with self.assertLogs('core.timing', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertTrue(record['slowest'])
+        self.assertLessEqual(len(record['slowest']), 3)
+
+    def test_metrics(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            response, 'yatube_request_seconds_count{view="posts:index"}'
+        )
+        self.assertContains(response, '# TYPE yatube_cache_hits_total counter')
+
+    def test_metrics_hidden_from_others(self):
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='203.0.113.1'
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class MetricsTest(SimpleTestCase):
+    def test_histogram(self):
+        registry = Registry()
+        histogram = registry.histogram('latency', 'Задержка.', (0.1, 1))
+        for value in (0.05, 0.5, 0.5, 3):
+            histogram.observe(value, view='index')
+        registry.counter('hits', 'Попадания.').inc(2, view='a"b')
+        lines = registry.render().splitlines()
+        self.assertIn('latency_bucket{le="0.1",view="index"} 1', lines)
+        self.assertIn('latency_bucket{le="1",view="index"} 3', lines)
+        self.assertIn('latency_bucket{le="+Inf",view="index"} 4', lines)
+        self.assertIn('latency_sum{view="index"} 4.05', lines)
+        self.assertIn('latency_count{view="index"} 4', lines)
+        self.assertIn(r'hits{view="a\"b"} 2', lines)
+
+    def test_processes_aggregated(self):
+        """Счётчики складываются по всем процессам, гауги —
+        только по живым."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry = Registry(directory)
+        # Пустой каталог останавливает поток сброса снимков.
+        self.addCleanup(setattr, registry, '_directory', '')
+        posts = registry.counter('posts', 'Посты.')
+        queue = registry.gauge('queue', 'Очередь.')
+        posts.inc(2)
+        queue.set(5)
+        pid = os.fork()
+        if not pid:
+            registry.after_fork()
+            posts.inc(3)
+            queue.set(7)
+            registry.flush()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        lines = registry.render().splitlines()
+        self.assertIn('posts 5', lines)
+        self.assertIn('queue 5', lines)
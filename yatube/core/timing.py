@@ -0,0 +1,214 @@
+"""Замеры каждого запроса: SQL, шаблоны и кеш.
+
+TimingMiddleware считает запросы к БД и их время, запоминает самые
+медленные, суммирует рендеринг шаблонов (вместе с запросами, которые
+из них выполнились) и попадания в кеш. Итог уходит в заголовок
+Server-Timing, в журнал core.timing и в гистограммы core.metrics.
+"""
+import contextvars
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends import django as django_backend
+from django.urls import Resolver404, resolve
+
+from .metrics import COUNT_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+# Длиннее SQL в журнал не пишем.
+MAX_SQL_LENGTH: int = 300
+
+REQUEST_SECONDS = registry.histogram(
+    'yatube_request_seconds', 'Время ответа на запрос.'
+)
+SQL_SECONDS = registry.histogram(
+    'yatube_request_sql_seconds', 'Время запросов к БД за один запрос.'
+)
+TEMPLATE_SECONDS = registry.histogram(
+    'yatube_request_template_seconds', 'Время рендеринга шаблонов.'
+)
+QUERIES = registry.histogram(
+    'yatube_request_queries', 'Запросов к БД за один запрос.',
+    COUNT_BUCKETS,
+)
+CACHE_HITS = registry.counter(
+    'yatube_cache_hits_total', 'Найденные в кеше ключи.'
+)
+CACHE_MISSES = registry.counter(
+    'yatube_cache_misses_total', 'Ключи, которых не было в кеше.'
+)
+
+IN_PROGRESS = registry.gauge(
+    'yatube_requests_in_progress', 'Запросы, которые сейчас обрабатываются.'
+)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = 0
+        self.queries = 0
+        self.sql_seconds = 0
+        # (секунды, SQL) самых медленных запросов, медленные первыми.
+        self.slowest = []
+        self.template_seconds = 0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper()."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            self.queries += 1
+            self.sql_seconds += seconds
+            self.slowest.append((seconds, sql[:MAX_SQL_LENGTH]))
+            self.slowest.sort(key=lambda row: row[0], reverse=True)
+            del self.slowest[settings.REQUEST_TIMING_SLOW_QUERIES:]
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.sql_seconds * 1000:.1f};'
+            f'desc="{self.queries} queries"',
+            f'tpl;dur={self.template_seconds * 1000:.1f}',
+            f'cache;desc="hits={self.cache_hits} '
+            f'misses={self.cache_misses}"',
+            f'total;dur={self.seconds * 1000:.1f}',
+        ))
+
+    def as_dict(self):
+        return {
+            'ms': round(self.seconds * 1000, 1),
+            'queries': self.queries,
+            'sql_ms': round(self.sql_seconds * 1000, 1),
+            'template_ms': round(self.template_seconds * 1000, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'slowest': [
+                {'ms': round(seconds * 1000, 1), 'sql': sql}
+                for seconds, sql in self.slowest
+            ],
+        }
+
+
+def current():
+    """Замеры текущего запроса или None вне TimingMiddleware."""
+    return _current.get()
+
+
+class TemplateTimer:
+    """Время внешнего шаблона: вложенные уже входят в него."""
+
+    def __enter__(self):
+        self.timings = current()
+        if self.timings is not None:
+            self.timings.template_depth += 1
+            self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            self.timings.template_depth -= 1
+            if not self.timings.template_depth:
+                self.timings.template_seconds += (
+                    time.perf_counter() - self.started
+                )
+
+
+def record_cache(hits, misses):
+    """Учитывает чтение из кеша в замерах текущего запроса."""
+    timings = current()
+    if timings is not None:
+        timings.cache_hits += hits
+        timings.cache_misses += misses
+
+
+class TimedTemplate(django_backend.Template):
+    def render(self, context=None, request=None):
+        with TemplateTimer():
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Шаблоны Django, время рендеринга которых попадает в замеры."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # Закешированные страницы отдаются до разбора URL.
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return 'unknown'
+    return match.view_name
+
+
+class TimingMiddleware:
+    """Замеряет запрос; ставится первым, чтобы видеть всё остальное."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        IN_PROGRESS.inc()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            IN_PROGRESS.dec()
+            _current.reset(token)
+        timings.seconds = time.perf_counter() - timings.started
+        if settings.REQUEST_TIMING_HEADER:
+            response['Server-Timing'] = timings.server_timing()
+        view = view_name(request)
+        self.log(request, response, view, timings)
+        if random.random() < settings.REQUEST_TIMING_SAMPLE_RATE:
+            self.observe(view, timings)
+        return response
+
+    def log(self, request, response, view, timings):
+        slow = timings.seconds * 1000 >= settings.REQUEST_TIMING_SLOW_MS
+        level = logging.WARNING if slow else logging.DEBUG
+        if not logger.isEnabledFor(level):
+            return
+        logger.log(level, json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            **timings.as_dict(),
+        }, ensure_ascii=False))
+
+    def observe(self, view, timings):
+        REQUEST_SECONDS.observe(timings.seconds, view=view)
+        SQL_SECONDS.observe(timings.sql_seconds, view=view)
+        TEMPLATE_SECONDS.observe(timings.template_seconds, view=view)
+        QUERIES.observe(timings.queries, view=view)
+        CACHE_HITS.inc(timings.cache_hits, view=view)
+        CACHE_MISSES.inc(timings.cache_misses, view=view)
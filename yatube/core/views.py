@@ -1,7 +1,14 @@
+import os
 from http import HTTPStatus
 
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from . import files
+from .metrics import registry
+
 
 def page_not_found(request, exception):
     '''Ошибка 404: страница не найдена.'''
@@ -25,3 +32,32 @@ def permission_denied(request, exception):
 def csrf_failure(request, reason=''):
     '''Ошибка 403: ошибка проверки CSRF.'''
     return render(request, 'core/403csrf.html')
+
+
+def media(request, path):
+    '''Файлы из MEDIA_ROOT.'''
+    return files.serve(request, path, settings.MEDIA_ROOT)
+
+
+def static(request, path):
+    '''Файлы из STATIC_ROOT вместе со сжатыми копиями.
+
+    Пока collectstatic не запускали, в режиме DEBUG ищем файл
+    в каталогах приложений.'''
+    document_root = settings.STATIC_ROOT
+    if settings.DEBUG and not os.path.isfile(
+        os.path.join(document_root, path)
+    ):
+        found = finders.find(path)
+        if found:
+            document_root = found[:-len(path)]
+    return files.serve(request, path, document_root, precompressed=True)
+
+
+def metrics(request):
+    '''Метрики процесса для Prometheus; только для METRICS_ALLOWED_IPS.'''
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
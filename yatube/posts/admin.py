@@ -1,20 +1,39 @@
 from django.contrib import admin
+
+from . import search
 from .models import Post, Group, Comment
 
 
-class PostAdmin(admin.ModelAdmin):
+class IndexSearchMixin:
+    """Поиск в списке по полнотекстовому индексу вместо LIKE '%q%'.
+
+    search_kind — какие документы индекса искать: search.POST
+    или search.COMMENT.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search.filter_queryset(
+            queryset, search_term, self.search_kind
+        ), False
+
+
+class PostAdmin(IndexSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'created', 'author', 'group')
     list_editable = ('group',)
     search_fields = ('text',)
     list_filter = ('created',)
     empty_value_display = '-пусто-'
+    search_kind = search.POST
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(IndexSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'created', 'author', 'post')
     search_fields = ('text',)
     list_filter = ('created',)
     empty_value_display = '-пусто-'
+    search_kind = search.COMMENT
 
 
 admin.site.register(Post, PostAdmin)
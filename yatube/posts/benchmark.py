@@ -0,0 +1,183 @@
+"""Замеры запросов к страницам: время ответа, запросы к БД,
+прочитанные строки и время рендеринга шаблонов.
+
+Результаты сохраняются в JSON и сравниваются с прошлым прогоном:
+compare() возвращает отличия, которые хуже допустимых порогов.
+"""
+import contextlib
+import functools
+import math
+import time
+
+from django.db import connections
+from django.db.backends.utils import CursorDebugWrapper
+from django.template.base import Template
+
+
+class Measure:
+    """Что насчитали за один запрос."""
+
+    def __init__(self):
+        self.seconds = 0
+        self.queries = 0
+        self.rows = 0
+        self.template_seconds = 0
+
+
+class RowCountingCursor(CursorDebugWrapper):
+    """Курсор, который считает запросы и выбранные из БД строки."""
+
+    def __init__(self, cursor, db, measure):
+        super().__init__(cursor, db)
+        self.measure = measure
+
+    def execute(self, sql, params=None):
+        self.measure.queries += 1
+        return super().execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.measure.queries += 1
+        return super().executemany(sql, param_list)
+
+    def _count(self, rows):
+        self.measure.rows += len(rows)
+        return rows
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.measure.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        return self._count(self.cursor.fetchmany(*args))
+
+    def fetchall(self):
+        return self._count(self.cursor.fetchall())
+
+    def __iter__(self):
+        for row in self.cursor:
+            self.measure.rows += 1
+            yield row
+
+
+@contextlib.contextmanager
+def count_queries(measure):
+    """Считает запросы и строки на всех соединениях: с репликами
+    (core.replicas) ленты читаются не из default."""
+    saved = []
+    for connection in connections.all():
+        saved.append((
+            connection,
+            connection.force_debug_cursor,
+            connection.make_debug_cursor,
+        ))
+        connection.force_debug_cursor = True
+        connection.make_debug_cursor = functools.partial(
+            RowCountingCursor, db=connection, measure=measure
+        )
+    try:
+        yield
+    finally:
+        for connection, force_debug_cursor, make_debug_cursor in saved:
+            connection.force_debug_cursor = force_debug_cursor
+            connection.make_debug_cursor = make_debug_cursor
+
+
+@contextlib.contextmanager
+def time_templates(measure):
+    """Суммирует время внешних шаблонов: вложенные через include
+    и фрагменты уже входят во время шаблона, который их вызвал."""
+    render = Template.render
+    depth = 0
+
+    def timed_render(template, context):
+        nonlocal depth
+        if depth:
+            return render(template, context)
+        depth += 1
+        started = time.perf_counter()
+        try:
+            return render(template, context)
+        finally:
+            measure.template_seconds += time.perf_counter() - started
+            depth -= 1
+
+    Template.render = timed_render
+    try:
+        yield
+    finally:
+        Template.render = render
+
+
+def measure(func):
+    """Вызывает func() и возвращает её результат и Measure."""
+    result = Measure()
+    with time_templates(result), count_queries(result):
+        started = time.perf_counter()
+        response = func()
+        result.seconds = time.perf_counter() - started
+    return response, result
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summary(measures, statuses):
+    """Сводка по замерам одного сценария для JSON."""
+    milliseconds = [item.seconds * 1000 for item in measures]
+    templates = [item.template_seconds * 1000 for item in measures]
+    queries = [item.queries for item in measures]
+    rows = [item.rows for item in measures]
+    count = len(measures)
+    return {
+        'requests': count,
+        'statuses': sorted(set(statuses)),
+        'p50_ms': round(percentile(milliseconds, 0.5), 3),
+        'p95_ms': round(percentile(milliseconds, 0.95), 3),
+        'p99_ms': round(percentile(milliseconds, 0.99), 3),
+        'template_p50_ms': round(percentile(templates, 0.5), 3),
+        'template_p95_ms': round(percentile(templates, 0.95), 3),
+        'queries_mean': round(sum(queries) / count, 2) if count else 0,
+        'queries_max': max(queries, default=0),
+        'rows_mean': round(sum(rows) / count, 2) if count else 0,
+        'rows_max': max(rows, default=0),
+    }
+
+
+def compare(results, baseline, latency=0.2, queries=0, rows=0.2,
+            min_latency_ms=5.0):
+    """Регрессии results относительно baseline: список строк.
+
+    latency и rows — допустимый относительный рост p95, p99 и среднего
+    числа строк, queries — сколько запросов к БД можно добавить.
+    Разница во времени меньше min_latency_ms считается шумом.
+    """
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for key in ('p95_ms', 'p99_ms'):
+            was, now = previous[key], current[key]
+            if now - was > max(was * latency, min_latency_ms):
+                regressions.append(
+                    f'{name}: {key} {was:.1f} -> {now:.1f} мс'
+                )
+        if current['queries_max'] - previous['queries_max'] > queries:
+            regressions.append(
+                f'{name}: запросов к БД {previous["queries_max"]} -> '
+                f'{current["queries_max"]}'
+            )
+        was, now = previous['rows_mean'], current['rows_mean']
+        if now > was * (1 + rows) and now - was >= 1:
+            regressions.append(
+                f'{name}: строк из БД {was:.0f} -> {now:.0f}'
+            )
+    return regressions
@@ -0,0 +1,205 @@
+"""Условные GET для лент и страниц постов.
+
+ETag складывается из поколений данных страницы (posts.generations)
+и пользователя, для которого она отрисована: шапка и кнопки зависят
+от него, а CSRF-токен формы — ещё и от сессии. Last-Modified — время
+последнего изменения тех же данных. Если клиент прислал совпадающий
+If-None-Match или If-Modified-Since, ответ 304 отдаётся до запросов
+за постами и до шаблонов.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Max
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from core import replicas
+
+from . import counters, feeds, generations
+from .models import Comment, Group, Post, User
+
+
+class Page:
+    """От чего зависит страница: поколения и время последней записи.
+
+    scopes — данные, общие для всех пользователей, user_scopes —
+    то, что видит только текущий пользователь. obj — уже найденный
+    объект страницы (группа, автор, пост), его берёт представление
+    через page_object(), чтобы не искать заново.
+    """
+
+    def __init__(self, scopes, latest, obj=None, user_scopes=()):
+        self.scopes = scopes
+        # Вызывается, только если времени изменения нет в кеше.
+        self.latest = latest
+        self.obj = obj
+        self.user_scopes = list(user_scopes)
+
+
+def _latest(queryset):
+    return lambda: queryset.aggregate(latest=Max('created'))['latest']
+
+
+def index_page(request):
+    return Page([counters.index_feed()], _latest(Post.objects.all()))
+
+
+def group_page(request, slug):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return None
+    return Page(
+        [counters.group_feed(group.pk)],
+        _latest(Post.objects.filter(group=group)),
+        group,
+    )
+
+
+def profile_page(request, username):
+    author = User.objects.filter(username=username).first()
+    if author is None:
+        return None
+    user_scopes = []
+    if request.user.is_authenticated:
+        # Кнопка «Подписаться» меняется вместе с лентой подписок.
+        user_scopes.append(counters.follow_feed(request.user.pk))
+    return Page(
+        [counters.author_feed(author.pk)],
+        _latest(Post.objects.filter(author=author)),
+        author,
+        user_scopes,
+    )
+
+
+def post_page(request, post_id):
+    post = Post.objects.select_related(
+        'author', 'group'
+    ).filter(pk=post_id).first()
+    if post is None:
+        return None
+
+    def latest():
+        comment = _latest(Comment.objects.filter(post_id=post_id))()
+        return max(post.created, comment) if comment else post.created
+
+    scopes = [
+        generations.post_scope(post_id),
+        counters.author_feed(post.author_id),
+    ]
+    if post.group_id:
+        # Название и ссылка группы.
+        scopes.append(counters.group_feed(post.group_id))
+    return Page(scopes, latest, post)
+
+
+def follow_page(request):
+    if not request.user.is_authenticated:
+        return None
+    return Page(
+        feeds.follow_feed_scopes(
+            request.user, feeds.large_author_ids(request.user)
+        ),
+        _latest(Post.objects.filter(author__following__user=request.user)),
+    )
+
+
+def page_object(request, queryset, **lookup):
+    """Объект страницы, который уже нашёл conditional_page,
+    или get_object_or_404(queryset, **lookup)."""
+    page = getattr(request, '_conditional_page', None)
+    if page is not None and page.obj is not None:
+        return page.obj
+    return get_object_or_404(queryset, **lookup)
+
+
+def session_tag(request):
+    """Отпечаток cookie сессии и CSRF.
+
+    После выхода и нового входа CSRF-токен меняется, и копия страницы
+    со старым токеном в форме уже не годится.
+    """
+    cookies = '{}:{}'.format(
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
+    return hashlib.md5(cookies.encode()).hexdigest()[:12]
+
+
+def page_etag(version, request):
+    """ETag страницы с данными версии version для request.user."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        user_tag = f'u{user.pk}-{session_tag(request)}'
+    else:
+        user_tag = 'anon'
+    return f'"{version}-{user_tag}"'
+
+
+def patch_page_cache_control(response, user):
+    # Браузер каждый раз переспрашивает сервер, а не угадывает
+    # свежесть страницы по Last-Modified.
+    if user.is_authenticated:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+
+
+def _use_primary_if_changed(page):
+    """Свежие изменения страницы реплика могла ещё не получить."""
+    if page is None or replicas.current() is None:
+        return
+    replicas.use_primary_if_changed(generations.modified(
+        page.scopes + page.user_scopes, page.latest
+    ))
+    if replicas.current() is None:
+        # Объект из реплики тоже мог отстать.
+        page.obj = None
+
+
+def _request_page(request, page_func, args, kwargs):
+    """Page запроса, найденная один раз: condition() спрашивает
+    ETag и Last-Modified по отдельности."""
+    if not hasattr(request, '_conditional_page'):
+        request._conditional_page = page_func(request, *args, **kwargs)
+        _use_primary_if_changed(request._conditional_page)
+    return request._conditional_page
+
+
+def conditional_page(page_func):
+    """Декоратор представления: ETag, Last-Modified и ответ 304.
+
+    page_func получает аргументы представления и возвращает Page
+    или None, если страницы нет, — тогда представление само ответит 404.
+    """
+    def page(request, *args, **kwargs):
+        return _request_page(request, page_func, args, kwargs)
+
+    def etag(request, *args, **kwargs):
+        found = page(request, *args, **kwargs)
+        if found is None:
+            return None
+        version = generations.version(*found.scopes, *found.user_scopes)
+        return page_etag(version, request)
+
+    def last_modified(request, *args, **kwargs):
+        found = page(request, *args, **kwargs)
+        if found is None:
+            return None
+        return generations.modified(
+            found.scopes + found.user_scopes, found.latest
+        )
+
+    def decorator(view):
+        conditional_view = condition(etag, last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.has_header('ETag'):
+                patch_page_cache_control(response, request.user)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+
+COUNT_KEY: str = 'feed_count:{}'
+
+
+def index_feed():
+    return 'index'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def author_feed(author_id):
+    return f'author:{author_id}'
+
+
+def follow_feed(user_id):
+    return f'follow:{user_id}'
+
+
+def post_feeds(post, follower_ids=()):
+    """Все ленты, в которых показывается пост."""
+    feeds = [index_feed()]
+    if post.group_id:
+        feeds.append(group_feed(post.group_id))
+    feeds.extend(follow_feed(user_id) for user_id in follower_ids)
+    return feeds
+
+
+def feed_count(feed, post_list):
+    """Число постов в ленте.
+
+    Считаем строки, когда счётчика нет в кеше, дальше его
+    поддерживают сигналы модели Post. Раз в FEED_COUNT_TIMEOUT
+    счётчик пересчитывается по БД: записи в обход сигналов
+    (bulk_create, update, правка БД руками) сбивают его ненадолго.
+    """
+    return cache.get_or_set(
+        COUNT_KEY.format(feed), post_list.count,
+        timeout=settings.FEED_COUNT_TIMEOUT,
+    )
+
+
+def change_counts(feeds, delta):
+    """Сдвигает счётчики лент, которые уже есть в кеше."""
+    for feed in feeds:
+        try:
+            cache.incr(COUNT_KEY.format(feed), delta)
+        except ValueError:
+            # Счётчика нет — он посчитается при следующем запросе.
+            pass
+
+
+def forget_counts(feeds):
+    cache.delete_many([COUNT_KEY.format(feed) for feed in feeds])
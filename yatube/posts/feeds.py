@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from . import counters, generations
+from .models import AuthorStats, FeedEntry, Follow, Post
+
+LARGE_AUTHORS_KEY: str = 'large_authors:{}:{}'
+
+
+def fanout_enabled():
+    return settings.FEED_FANOUT_ON_WRITE
+
+
+def is_large_author(author_id):
+    """Посты крупных авторов не раскладываем, а читаем при запросе."""
+    return AuthorStats.objects.for_author(author_id).large
+
+
+def mark_large_author(author_id):
+    """Отмечает автора крупным, если подписчиков у него стало больше
+    FEED_FANOUT_MAX_FOLLOWERS. Возвращает True, если отметили сейчас.
+
+    Посты крупного автора не трогают ни входящие ленты, ни счётчики
+    и поколения лент подписчиков. Сам автор крупным быть не перестаёт:
+    его посты за это время в ленты не попали. Отметку снимает
+    rebuild_follow_feeds, заново заполняя ленты.
+    """
+    return bool(AuthorStats.objects.filter(
+        author_id=author_id,
+        large=False,
+        followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).update(large=True))
+
+
+def large_author_ids(user):
+    """Крупные авторы, на которых подписан user.
+
+    Список кешируется до смены поколения ленты подписок: его сдвигают
+    подписка, отписка и отметка автора крупным.
+    """
+    key = LARGE_AUTHORS_KEY.format(
+        user.pk, generations.version(counters.follow_feed(user.pk))
+    )
+    return cache.get_or_set(key, lambda: list(Follow.objects.filter(
+        user=user, author__stats__large=True
+    ).values_list('author_id', flat=True)))
+
+
+def large_authors_posts(author_ids):
+    """Число постов крупных авторов: в счётчик ленты они не входят."""
+    if not author_ids:
+        return 0
+    return AuthorStats.objects.filter(author__in=author_ids).aggregate(
+        total=Sum('posts')
+    )['total'] or 0
+
+
+def follow_feed_scopes(user, large_author_ids):
+    """Поколения ленты подписок user: её собственное и лент крупных
+    авторов, посты которых поколение подписчиков не сдвигают."""
+    return [
+        counters.follow_feed(user.pk),
+        *(counters.author_feed(author_id) for author_id in large_author_ids),
+    ]
+
+
+def _bulk_create(entries):
+    FeedEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков пачками."""
+    if not fanout_enabled() or is_large_author(post.author_id):
+        return
+    batch_size = settings.FEED_FANOUT_BATCH_SIZE
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    batch = []
+    for user_id in follower_ids.iterator(chunk_size=batch_size):
+        batch.append(
+            FeedEntry(user_id=user_id, post=post, created=post.created)
+        )
+        if len(batch) >= batch_size:
+            _bulk_create(batch)
+            batch = []
+    if batch:
+        _bulk_create(batch)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    if not fanout_enabled() or is_large_author(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-created', '-pk'
+    ).values_list('pk', 'created')[:settings.FEED_BACKFILL_POSTS]
+    _bulk_create([
+        FeedEntry(user_id=user_id, post_id=post_id, created=created)
+        for post_id, created in posts
+    ])
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def follow_feed_posts(user, large_author_ids=()):
+    """Выборки, из которых собирается лента подписок пользователя.
+
+    Без fan-out лента считается соединением с подписками при чтении,
+    с fan-out посты берутся из входящей ленты. Посты крупных авторов
+    в обоих случаях идут отдельной выборкой: первая — ровно то, что
+    считает счётчик ленты.
+    """
+    posts = Post.objects.for_feed()
+    if fanout_enabled():
+        own = posts.filter(feed_entries__user=user)
+    else:
+        own = posts.filter(author__following__user=user)
+    if not large_author_ids:
+        return [own]
+    return [
+        own.exclude(author__in=large_author_ids),
+        posts.filter(author__in=large_author_ids),
+    ]
@@ -0,0 +1,95 @@
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+
+from . import counters
+
+GENERATION_KEY: str = 'feed_gen:{}'
+MODIFIED_KEY: str = 'feed_modified:{}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def user_scope(user_id):
+    """Данные пользователя в карточках его постов: имя."""
+    return f'user:{user_id}'
+
+
+def _initial():
+    # Счётчик, вытесненный из кеша, не должен вернуться к старому
+    # значению, иначе снова станут видны устаревшие фрагменты.
+    return int(time.time() * 1000)
+
+
+def current(scopes):
+    """Текущие поколения scopes одним обращением к кешу."""
+    keys = {scope: GENERATION_KEY.format(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    missing = {
+        key: _initial() for key in keys.values() if key not in found
+    }
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {scope: found[key] for scope, key in keys.items()}
+
+
+def version(*scopes):
+    """Версия данных для ключа кеша: поколения всех scopes."""
+    found = current(scopes)
+    return '.'.join(str(found[scope]) for scope in scopes)
+
+
+def bump(scopes):
+    """Новое поколение для scopes: старые фрагменты больше не читаются."""
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial(), timeout=None)
+    now = time.time()
+    cache.set_many(
+        {MODIFIED_KEY.format(scope): now for scope in scopes}, timeout=None
+    )
+
+
+def modified(scopes, latest):
+    """Время последнего изменения scopes.
+
+    Время записывает bump(). Если для какого-то scope его в кеше нет,
+    берётся latest() — самое позднее время создания из БД — и
+    запоминается, чтобы не спрашивать БД на каждый запрос.
+    """
+    keys = [MODIFIED_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        value = latest()
+        stamp = value.timestamp() if value else time.time()
+        cache.set_many({key: stamp for key in missing}, timeout=None)
+        found.update(dict.fromkeys(missing, stamp))
+    return datetime.fromtimestamp(max(found.values()), tz=timezone.utc)
+
+
+def post_scopes(post, follower_ids=()):
+    """Все поколения, которые зависят от поста."""
+    scopes = counters.post_feeds(post, follower_ids)
+    scopes.append(counters.author_feed(post.author_id))
+    scopes.append(post_scope(post.pk))
+    return scopes
+
+
+def author_scopes(author_id, follower_ids=(), group_ids=()):
+    """Все поколения страниц, где есть карточки постов автора."""
+    scopes = [
+        counters.index_feed(),
+        counters.author_feed(author_id),
+        user_scope(author_id),
+    ]
+    scopes.extend(counters.group_feed(group_id) for group_id in group_ids)
+    scopes.extend(counters.follow_feed(user_id) for user_id in follower_ids)
+    return scopes
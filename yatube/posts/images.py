@@ -0,0 +1,100 @@
+"""Обработка картинок, которые загружают в посты.
+
+Картинка декодируется один раз и сразу в уменьшенном виде: JPEG
+через draft() читается с нужным масштабом. В хранилище попадает
+перекодированный файл без метаданных и не больше
+POST_IMAGE_MAX_PIXELS пикселей, поэтому миниатюры потом строятся
+из небольшого исходника.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Форматы, которые сохраняем как есть: формат Pillow -> расширение.
+KEEP_FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+
+def fit_size(size, max_pixels):
+    """Размер с теми же пропорциями и не больше max_pixels пикселей."""
+    width, height = size
+    if width * height <= max_pixels:
+        return size
+    scale = (max_pixels / (width * height)) ** 0.5
+    return max(int(width * scale), 1), max(int(height * scale), 1)
+
+
+def _target_format(image, source_format):
+    Image.init()
+    if source_format in KEEP_FORMATS and source_format in Image.SAVE:
+        return source_format
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (
+        'transparency' in image.info
+    )
+    return 'PNG' if has_alpha else 'JPEG'
+
+
+def _encode(image, image_format):
+    params = {}
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        params = {'quality': settings.POST_IMAGE_QUALITY, 'optimize': True}
+    elif image_format == 'WEBP':
+        params = {'quality': settings.POST_IMAGE_QUALITY}
+    elif image_format == 'PNG':
+        params = {'optimize': True}
+    if image.mode == 'CMYK':
+        image = image.convert('RGB')
+    if image_format != 'JPEG' and 'transparency' in image.info:
+        # Прозрачность — не метаданные, её сохраняем.
+        params['transparency'] = image.info['transparency']
+    # Некоторые кодеки берут EXIF и ICC из info, поэтому чистим его.
+    image.info = {}
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **params)
+    return buffer.getvalue()
+
+
+def normalize(upload):
+    """Перекодированная копия загруженной картинки.
+
+    У анимаций остаётся первый кадр, EXIF и прочие метаданные
+    отбрасываются, ориентация из EXIF применяется к пикселям.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл слишком большой: не больше %(limit)d МБ.',
+            code='file_too_large',
+            params={
+                'limit': settings.POST_IMAGE_MAX_UPLOAD_SIZE // 1024 // 1024
+            },
+        )
+    max_pixels = settings.POST_IMAGE_MAX_PIXELS
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+        source_format = image.format
+        image.draft(None, fit_size(image.size, max_pixels))
+        image.load()
+        image = ImageOps.exif_transpose(image)
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Не удалось прочитать картинку.', code='invalid_image'
+        )
+    target = fit_size(image.size, max_pixels)
+    if target != image.size:
+        image = image.resize(target, Image.LANCZOS)
+    image_format = _target_format(image, source_format)
+    name = os.path.basename(upload.name)
+    if image_format != source_format:
+        name = f'{os.path.splitext(name)[0]}.{KEEP_FORMATS[image_format]}'
+    return ContentFile(_encode(image, image_format), name=name)
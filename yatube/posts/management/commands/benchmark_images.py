@@ -0,0 +1,90 @@
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageOps
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время кодирования и размер вариантов картинки '
+            'карточки в JPEG и в форматах из POST_CARD_FORMATS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Сколько картинок постов взять.',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Сколько раз кодировать каждый вариант.',
+        )
+
+    def handle(self, *args, **options):
+        names = list(Post.objects.exclude(image='').order_by(
+            '-created'
+        ).values_list('image', flat=True)[:options['limit']])
+        if not names:
+            raise CommandError('Нет постов с картинками.')
+        formats = ['JPEG', *thumbnails.available_formats()]
+        skipped = set(settings.POST_CARD_FORMATS) - set(formats)
+        if skipped:
+            self.stdout.write(
+                f'Pillow не умеет сохранять: {", ".join(sorted(skipped))}.'
+            )
+        # (формат, ширина) -> [секунд, байт]
+        totals = {}
+        originals = 0
+        for name in names:
+            with default_storage.open(name) as file:
+                data = file.read()
+            originals += len(data)
+            source = Image.open(BytesIO(data))
+            source.load()
+            variants = self.variants(source, formats, options['repeat'])
+            for key, seconds, size in variants:
+                total = totals.setdefault(key, [0, 0])
+                total[0] += seconds
+                total[1] += size
+        count = len(names)
+        self.stdout.write(
+            f'Картинок: {count}, исходники в среднем '
+            f'{originals / count / 1024:.1f} КБ.'
+        )
+        self.stdout.write(f'{"формат":<6} {"ширина":>6} {"мс":>8} '
+                          f'{"КБ":>8} {"от JPEG":>8}')
+        for (image_format, width), (seconds, size) in sorted(totals.items()):
+            jpeg_size = totals[('JPEG', width)][1]
+            self.stdout.write(
+                f'{image_format:<6} {width:>6} '
+                f'{seconds / count * 1000:>8.1f} '
+                f'{size / count / 1024:>8.1f} '
+                f'{size / jpeg_size:>8.0%}'
+            )
+
+    def variants(self, source, formats, repeat):
+        geometry, _ = settings.POST_THUMBNAILS[thumbnails.CARD]
+        width, height = (int(side) for side in geometry.split('x'))
+        image = source.convert('RGB')
+        for variant_width in settings.POST_CARD_WIDTHS:
+            size = (variant_width, round(height * variant_width / width))
+            resized = ImageOps.fit(image, size, Image.LANCZOS)
+            for image_format in formats:
+                seconds, encoded = self.encode(
+                    resized, image_format, repeat
+                )
+                yield (image_format, variant_width), seconds, encoded
+
+    def encode(self, image, image_format, repeat):
+        repeat = max(repeat, 1)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            buffer = BytesIO()
+            image.save(buffer, format=image_format,
+                       quality=sorl_settings.THUMBNAIL_QUALITY)
+        return (time.perf_counter() - started) / repeat, buffer.tell()
@@ -0,0 +1,178 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts import benchmark
+from posts.models import Post
+
+User = get_user_model()
+
+# Пользователь, от имени которого идёт нагрузка. Удаляется в конце
+# вместе со всем, что успел написать.
+USER = 'benchmark-load'
+
+# Настройки SQLite по умолчанию: журнал отката и полная синхронизация.
+# journal_mode хранится в файле БД, поэтому его надо вернуть явно.
+DEFAULT_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full'}
+
+
+class Command(BaseCommand):
+    help = ('Нагружает SQLite параллельными чтениями и записями '
+            'через представления posts: сначала с настройками SQLite '
+            'по умолчанию, затем с settings.SQLITE_PRAGMAS и '
+            'постоянными соединениями. Печатает пропускную способность, '
+            'p95 и число ошибок «database is locked».')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--seconds', type=float, default=10,
+            help='Длительность каждого прогона.',
+        )
+        parser.add_argument(
+            '--readers', type=int, default=8,
+            help='Потоков, открывающих ленту и посты.',
+        )
+        parser.add_argument(
+            '--writers', type=int, default=2,
+            help='Потоков, пишущих посты и комментарии.',
+        )
+        parser.add_argument(
+            '--conn-max-age', type=int, default=600,
+            help='CONN_MAX_AGE во втором прогоне.',
+        )
+
+    def handle(self, *args, **options):
+        database = connections.databases[DEFAULT_DB_ALIAS]
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('Команда только для SQLite.')
+        self.options = options
+        self.posts = list(
+            Post.objects.order_by('-pk').values_list('pk', flat=True)[:1000]
+        )
+        if not self.posts:
+            raise CommandError(
+                'Нет постов, сначала запустите generate_load_data.'
+            )
+        User.objects.filter(username=USER).delete()
+        self.user = User.objects.create_user(USER)
+        phases = [
+            ('default', DEFAULT_PRAGMAS, 0),
+            ('tuned', settings.SQLITE_PRAGMAS, options['conn_max_age']),
+        ]
+        conn_max_age = database['CONN_MAX_AGE']
+        results = {}
+        try:
+            for name, pragmas, max_age in phases:
+                database['CONN_MAX_AGE'] = max_age
+                with override_settings(SQLITE_PRAGMAS=pragmas):
+                    # Новые соединения получат PRAGMA этого прогона.
+                    # Режим журнала меняем заранее, пока к БД никто
+                    # не подключён.
+                    connections.close_all()
+                    connections[DEFAULT_DB_ALIAS].ensure_connection()
+                    connections.close_all()
+                    results[name] = self.run()
+        finally:
+            database['CONN_MAX_AGE'] = conn_max_age
+            connections.close_all()
+            self.user.delete()
+        self.report(results)
+
+    def run(self):
+        """Один прогон: {'read' | 'write': [(секунды, удачно), ...]}."""
+        deadline = time.perf_counter() + self.options['seconds']
+        results = {'read': [], 'write': []}
+        threads = []
+        for kind, count in (
+            ('read', self.options['readers']),
+            ('write', self.options['writers']),
+        ):
+            for number in range(count):
+                client = Client()
+                client.force_login(self.user)
+                threads.append(threading.Thread(
+                    target=self.work,
+                    args=(client, kind, number, deadline, results),
+                ))
+        connections.close_all()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def work(self, client, kind, number, deadline, results):
+        rng = random.Random(f'{self.options["seed"]}-{kind}-{number}')
+        measures = results[kind]
+        try:
+            step = 0
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = self.request(client, kind, step, rng)
+                    ok = response.status_code < 400
+                except DatabaseError:
+                    ok = False
+                measures.append((time.perf_counter() - started, ok))
+                step += 1
+        finally:
+            # У каждого потока своё соединение.
+            connections.close_all()
+
+    def request(self, client, kind, step, rng):
+        post_id = rng.choice(self.posts)
+        if kind == 'read' and step % 2:
+            return client.get(reverse('posts:post_detail', args=[post_id]))
+        if kind == 'read':
+            return client.get(
+                reverse('posts:index'), {'page': rng.randint(1, 5)}
+            )
+        if step % 2:
+            return client.post(
+                reverse('posts:add_comment', args=[post_id]),
+                {'text': f'Комментарий {step}'},
+            )
+        return client.post(
+            reverse('posts:post_create'), {'text': f'Пост {step}'}
+        )
+
+    def report(self, results):
+        seconds = self.options['seconds']
+        self.stdout.write(
+            f'{"прогон":<8} {"запр/с":>8} {"чтение p95":>11} '
+            f'{"запись p95":>11} {"ошибки":>7}'
+        )
+        throughput = {}
+        for name, phase in results.items():
+            done = [
+                measure for measures in phase.values()
+                for measure in measures if measure[1]
+            ]
+            errors = sum(
+                not ok for measures in phase.values() for _, ok in measures
+            )
+            throughput[name] = len(done) / seconds
+            p95 = {
+                kind: benchmark.percentile(
+                    [spent for spent, _ in measures], 0.95
+                ) * 1000
+                for kind, measures in phase.items()
+            }
+            self.stdout.write(
+                f'{name:<8} {throughput[name]:>8.1f} '
+                f'{p95["read"]:>9.1f}мс {p95["write"]:>9.1f}мс '
+                f'{errors:>7}'
+            )
+        if throughput['default']:
+            self.stdout.write(self.style.SUCCESS(
+                'Прирост пропускной способности: '
+                f'{throughput["tuned"] / throughput["default"]:.2f}x.'
+            ))
@@ -0,0 +1,274 @@
+import json
+import random
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import benchmark
+from posts.models import AuthorStats, Follow, Post
+
+User = get_user_model()
+
+# Читатель, от имени которого идут запросы вошедшего пользователя.
+# Создаётся заново на каждый прогон и удаляется вместе со всем,
+# что успел написать.
+READER = 'benchmark-reader'
+
+# Имя сценария -> (метод, нужен ли вход, ожидаемый код ответа).
+SCENARIOS = {
+    'index': ('get', False, 200),
+    'group_list': ('get', False, 200),
+    'profile': ('get', False, 200),
+    'post_detail': ('get', False, 200),
+    'follow_index': ('get', True, 200),
+    'create': ('post', True, 302),
+    'edit': ('post', True, 302),
+    'comment': ('post', True, 302),
+    'follow': ('get', True, 302),
+    'unfollow': ('get', True, 302),
+}
+
+
+class Command(BaseCommand):
+    help = ('Замеряет страницы posts: перцентили времени ответа, '
+            'запросы к БД, прочитанные строки и рендеринг шаблонов. '
+            'Сохраняет результат в JSON и падает при регрессии '
+            'относительно --baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Сколько запросов замерить в каждом сценарии.',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=10,
+            help='Сколько запросов сделать до замеров.',
+        )
+        parser.add_argument(
+            '--scenario', action='append', choices=list(SCENARIOS),
+            help='Только эти сценарии; можно указать несколько раз.',
+        )
+        parser.add_argument(
+            '--pages', type=int, default=5,
+            help='Номера страниц лент берутся от 1 до этого.',
+        )
+        parser.add_argument(
+            '--following', type=int, default=100,
+            help='На скольких самых активных авторов подписан читатель.',
+        )
+        parser.add_argument(
+            '--login', action='store_true',
+            help='Открывать ленты и посты от имени читателя.',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом.',
+        )
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument(
+            '--baseline',
+            help='JSON прошлого прогона для поиска регрессий.',
+        )
+        parser.add_argument(
+            '--latency-threshold', type=float, default=0.2,
+            help='Допустимый рост p95 и p99, доля.',
+        )
+        parser.add_argument(
+            '--min-latency-ms', type=float, default=5.0,
+            help='Меньшая разница во времени считается шумом.',
+        )
+        parser.add_argument(
+            '--query-threshold', type=int, default=0,
+            help='Сколько запросов к БД можно добавить.',
+        )
+        parser.add_argument(
+            '--rows-threshold', type=float, default=0.2,
+            help='Допустимый рост числа прочитанных строк, доля.',
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            # Тёплый кеш с холодным или гостя с читателем не сравнить.
+            for key in ('login', 'cold'):
+                if baseline['options'][key] != options[key]:
+                    raise CommandError(
+                        f'--{key} не совпадает с --baseline.'
+                    )
+        self.options = options
+        self.random = random.Random(options['seed'])
+        names = options['scenario'] or list(SCENARIOS)
+        count = options['warmup'] + options['requests']
+        self.posts = self.sample_posts(count)
+        self.reader = self.create_reader()
+        try:
+            self.anonymous = Client()
+            self.client = Client()
+            self.client.force_login(self.reader)
+            self.own_post = Post.objects.create(
+                author=self.reader, text='Пост для замеров'
+            )
+            followed = set(Follow.objects.filter(
+                user=self.reader
+            ).values_list('author__username', flat=True))
+            self.authors = [
+                author for author in dict.fromkeys(
+                    username for _, username, _ in self.posts
+                )
+                if author not in followed and author != READER
+            ] or [READER]
+            results = {
+                'created': timezone.now().isoformat(),
+                'options': {
+                    key: options[key] for key in (
+                        'seed', 'requests', 'warmup', 'login', 'cold'
+                    )
+                },
+                'cache': settings.CACHES['default']['BACKEND'],
+                'data': {
+                    'users': User.objects.count(),
+                    'posts': Post.objects.count(),
+                },
+                'scenarios': {
+                    name: self.run(name, count) for name in names
+                },
+            }
+        finally:
+            self.reader.delete()
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        self.report(results)
+        self.stdout.write(f'Результаты: {options["output"]}.')
+
+        errors = [
+            f'{name}: ответы {scenario["statuses"]}'
+            for name, scenario in results['scenarios'].items()
+            if scenario['statuses'] != [SCENARIOS[name][2]]
+        ]
+        if baseline is not None:
+            errors += benchmark.compare(
+                results, baseline,
+                latency=options['latency_threshold'],
+                queries=options['query_threshold'],
+                rows=options['rows_threshold'],
+                min_latency_ms=options['min_latency_ms'],
+            )
+        if errors:
+            raise CommandError('Регрессии:\n' + '\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def sample_posts(self, count):
+        """Случайные посты: (id, автор, slug группы или None)."""
+        bounds = Post.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            raise CommandError(
+                'Нет постов, сначала запустите generate_load_data.'
+            )
+        found = {}
+        # Между id бывают дыры: берём с запасом, пока не наберём.
+        for _ in range(10):
+            ids = [
+                self.random.randint(bounds['low'], bounds['high'])
+                for _ in range(count * 2)
+            ]
+            found.update(
+                (pk, (pk, username, slug))
+                for pk, username, slug in Post.objects.filter(
+                    pk__in=ids
+                ).values_list('pk', 'author__username', 'group__slug')
+            )
+            if len(found) >= count:
+                break
+        posts = sorted(found.values())
+        self.random.shuffle(posts)
+        return posts
+
+    def create_reader(self):
+        User.objects.filter(username=READER).delete()
+        reader = User.objects.create_user(READER)
+        authors = AuthorStats.objects.order_by('-posts').values_list(
+            'author_id', flat=True
+        )[:self.options['following']]
+        for author_id in authors:
+            Follow.objects.create(user=reader, author_id=author_id)
+        return reader
+
+    def page(self):
+        return {'page': self.random.randint(1, self.options['pages'])}
+
+    def request_args(self, name, number):
+        """URL и данные запроса number сценария name."""
+        post_id, username, slug = self.posts[number % len(self.posts)]
+        if name == 'index':
+            return reverse('posts:index'), self.page()
+        if name == 'group_list':
+            slug = slug or next(
+                (slug for _, _, slug in self.posts if slug), None
+            )
+            if slug is None:
+                raise CommandError('Нет постов в группах.')
+            return reverse('posts:group_list', args=[slug]), self.page()
+        if name == 'profile':
+            return reverse('posts:profile', args=[username]), self.page()
+        if name == 'post_detail':
+            return reverse('posts:post_detail', args=[post_id]), {}
+        if name == 'follow_index':
+            return reverse('posts:follow_index'), self.page()
+        if name == 'create':
+            return reverse('posts:post_create'), {
+                'text': f'Новый пост {number}'
+            }
+        if name == 'edit':
+            return reverse('posts:post_edit', args=[self.own_post.pk]), {
+                'text': f'Исправленный пост {number}'
+            }
+        if name == 'comment':
+            return reverse('posts:add_comment', args=[post_id]), {
+                'text': f'Комментарий {number}'
+            }
+        # Подписки и отписки идут по одним и тем же авторам,
+        # так что после пары сценариев подписки читателя прежние.
+        author = self.authors[number % len(self.authors)]
+        return reverse(f'posts:profile_{name}', args=[author]), {}
+
+    def run(self, name, count):
+        method, login, _ = SCENARIOS[name]
+        client = self.client if login or self.options['login'] else (
+            self.anonymous
+        )
+        measures = []
+        statuses = []
+        for number in range(count):
+            url, data = self.request_args(name, number)
+            if self.options['cold']:
+                cache.clear()
+            response, measure = benchmark.measure(
+                lambda: getattr(client, method)(url, data)
+            )
+            if number >= self.options['warmup']:
+                measures.append(measure)
+                statuses.append(response.status_code)
+        return benchmark.summary(measures, statuses)
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"сценарий":<13} {"p50":>8} {"p95":>8} {"p99":>8} '
+            f'{"шаблон":>8} {"запросы":>8} {"строки":>8}'
+        )
+        for name, scenario in results['scenarios'].items():
+            self.stdout.write(
+                f'{name:<13} {scenario["p50_ms"]:>8.1f} '
+                f'{scenario["p95_ms"]:>8.1f} {scenario["p99_ms"]:>8.1f} '
+                f'{scenario["template_p50_ms"]:>8.1f} '
+                f'{scenario["queries_mean"]:>8.1f} '
+                f'{scenario["rows_mean"]:>8.0f}'
+            )
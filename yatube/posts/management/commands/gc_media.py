@@ -0,0 +1,96 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core.storage import TEMP_PREFIX
+from posts import generations
+from posts.models import Post
+from posts.signals import feed_follower_ids
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов, на которые не ссылается ни один '
+            'пост, вместе с их миниатюрами и записями sorl-thumbnail. '
+            'С --rehash сначала переносит старые файлы под имена '
+            'по содержимому, чтобы одинаковые файлы слились.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+        parser.add_argument(
+            '--grace', type=int, default=3600,
+            help='Не трогать файлы моложе стольких секунд: их пост '
+                 'может быть ещё не сохранён.',
+        )
+        parser.add_argument(
+            '--rehash', action='store_true',
+            help='Перенести файлы постов под имена по содержимому.',
+        )
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        self.storage = field.storage
+        self.directory = field.upload_to.rstrip('/')
+        self.dry_run = options['dry_run']
+        if options['rehash']:
+            self.rehash()
+        referenced = set(
+            Post.objects.exclude(image='').values_list('image', flat=True)
+        )
+        deadline = time.time() - options['grace']
+        removed = 0
+        for name in self.files():
+            if name in referenced:
+                continue
+            path = self.storage.path(name)
+            if os.path.getmtime(path) > deadline:
+                continue
+            # Пост мог получить этот файл уже после выборки выше.
+            if Post.objects.filter(image=name).exists():
+                continue
+            removed += 1
+            self.stdout.write(f'Удаляем {name}')
+            if self.dry_run:
+                continue
+            if not os.path.basename(name).startswith(TEMP_PREFIX):
+                default.kvstore.delete(ImageFile(name, self.storage))
+            self.storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов без постов: {removed}.'
+        ))
+
+    def files(self):
+        if not self.storage.exists(self.directory):
+            return []
+        _, files = self.storage.listdir(self.directory)
+        return sorted(os.path.join(self.directory, name) for name in files)
+
+    def rehash(self):
+        moved = 0
+        posts = Post.objects.exclude(image='').only(
+            'image', 'author_id', 'group_id'
+        )
+        for post in posts.iterator():
+            old_name = post.image.name
+            if not self.storage.exists(old_name):
+                continue
+            with self.storage.open(old_name) as file:
+                new_name = self.storage.name_for(old_name, file)
+                if new_name == old_name:
+                    continue
+                if not self.dry_run:
+                    self.storage.save(old_name, file)
+            moved += 1
+            self.stdout.write(f'{old_name} -> {new_name}')
+            if not self.dry_run:
+                Post.objects.filter(pk=post.pk).update(image=new_name)
+                # Кешированные карточки ссылаются на старый файл.
+                generations.bump(generations.post_scopes(
+                    post, feed_follower_ids(post.author_id)
+                ))
+        self.stdout.write(f'Перенесено под имена по содержимому: {moved}.')
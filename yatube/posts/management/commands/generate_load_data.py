@@ -0,0 +1,316 @@
+import contextlib
+import itertools
+import random
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from PIL import Image, ImageDraw, ImageFilter
+
+from posts import feeds, search
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = '''
+    город утро вечер дорога река поезд кошка собака книга письмо дом
+    окно сад море лес снег дождь солнце ветер музыка фильм кофе чай
+    работа отпуск проект код сервер база запрос страница лента пост
+    друг семья праздник выставка концерт фотография прогулка парк
+    новый старый тихий быстрый долгий красивый тёплый холодный
+    читал видел нашёл написал сделал увидел вспомнил решил начал
+    сегодня вчера снова наконец почему-то давно рядом далеко вместе
+'''.split()
+# Все тестовые пользователи получают этот пароль.
+PASSWORD = 'load-password'
+# От этого момента по умолчанию отсчитываются даты постов, чтобы
+# данные зависели только от --seed, а не от времени запуска.
+EPOCH = '2025-01-01T00:00:00+00:00'
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса степенного распределения по рангу."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+@contextlib.contextmanager
+def explicit_created(model):
+    """bulk_create с заданным created вместо auto_now_add."""
+    field = model._meta.get_field('created')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ('Заполняет БД большим детерминированным набором данных '
+            'для замеров: пользователи, группы, посты с картинками, '
+            'комментарии и подписки со степенным распределением.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=2000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=2000000)
+        parser.add_argument('--follows', type=int, default=500000)
+        parser.add_argument(
+            '--images', type=int, default=50,
+            help='Сколько разных картинок сгенерировать.',
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.3,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона популярности авторов.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до --now распределить посты.',
+        )
+        parser.add_argument(
+            '--now', default=EPOCH,
+            help='Самая поздняя дата постов и комментариев, ISO 8601.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='load',
+            help='Префикс имён пользователей и адресов групп.',
+        )
+        parser.add_argument(
+            '--skip-search-index', action='store_true',
+            help='Не перестраивать поисковый индекс.',
+        )
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(
+                f'Пользователи с префиксом «{prefix}» уже есть, '
+                f'выберите другой --prefix.'
+            )
+        self.now = parse_datetime(options['now'])
+        if self.now is None:
+            raise CommandError(f'--now: не дата «{options["now"]}».')
+        if self.now.tzinfo is None:
+            self.now = self.now.replace(tzinfo=timezone.utc)
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # Время создания постов по порядку id: комментарии пишутся
+        # после своего поста.
+        self.post_times = array('d')
+        self.options = options
+
+        user_ids = self.step('Пользователи', self.create_users)
+        group_ids = self.step('Группы', self.create_groups)
+        images = self.step('Картинки', self.create_images)
+        post_ids = self.step(
+            'Посты', self.create_posts, user_ids, group_ids, images
+        )
+        self.step('Комментарии', self.create_comments, user_ids, post_ids)
+        self.step('Подписки', self.create_follows, user_ids)
+
+        self.step('Статистика авторов', AuthorStats.objects.rebuild)
+        if not options['skip_search_index']:
+            self.step('Поисковый индекс', search.rebuild)
+        if feeds.fanout_enabled():
+            self.step('Ленты подписок', call_command, 'rebuild_follow_feeds')
+        # Счётчики и поколения в кеше не знают о новых строках.
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS('Данные созданы.'))
+
+    def step(self, title, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.stdout.write(
+            f'{title}: {time.perf_counter() - started:.1f} с.'
+        )
+        return result
+
+    def bulk_create(self, model, objects):
+        """Вставляет objects пачками, не держа их все в памяти."""
+        objects = iter(objects)
+        total = 0
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                return total
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            total += len(batch)
+
+    def new_ids(self, model, create):
+        """Создаёт строки и возвращает их id по порядку."""
+        last_id = model.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        create()
+        return list(model.objects.filter(pk__gt=last_id).order_by(
+            'pk'
+        ).values_list('pk', flat=True))
+
+    def text(self, low, high):
+        words = self.random.choices(WORDS, k=self.random.randint(low, high))
+        return ' '.join(words).capitalize() + '.'
+
+    def created(self):
+        # Свежих постов больше, чем старых.
+        age = self.random.expovariate(1) / 5 * self.options['days']
+        return self.now - timedelta(
+            days=min(age, self.options['days']),
+            seconds=self.random.randrange(86400),
+        )
+
+    def comment_created(self, post_created):
+        # Обсуждают в основном в первые сутки после поста.
+        delay = timedelta(hours=self.random.expovariate(1 / 12))
+        return min(post_created + delay, self.now)
+
+    def create_users(self):
+        prefix = self.options['prefix']
+        password = make_password(PASSWORD)
+        return self.new_ids(User, lambda: self.bulk_create(User, (
+            User(
+                username=f'{prefix}-{i}',
+                first_name=self.random.choice(WORDS).capitalize(),
+                password=password,
+            )
+            for i in range(self.options['users'])
+        )))
+
+    def create_groups(self):
+        prefix = self.options['prefix']
+        return self.new_ids(Group, lambda: self.bulk_create(Group, (
+            Group(
+                title=f'Группа {i}',
+                slug=f'{prefix}-group-{i}',
+                description=self.text(5, 30),
+            )
+            for i in range(self.options['groups'])
+        )))
+
+    def create_images(self):
+        storage = Post._meta.get_field('image').storage
+        return [
+            storage.save('posts/load.jpg', ContentFile(self.image()))
+            for _ in range(self.options['images'])
+        ]
+
+    def image(self):
+        """JPEG, похожий на фотографию: градиент неба, пятна, шум."""
+        width, height = self.random.choice(
+            [(1280, 720), (1080, 1080), (960, 1280), (1920, 1080)]
+        )
+        top = tuple(self.random.randrange(256) for _ in range(3))
+        bottom = tuple(self.random.randrange(256) for _ in range(3))
+        image = Image.new('RGB', (1, 2))
+        image.putpixel((0, 0), top)
+        image.putpixel((0, 1), bottom)
+        image = image.resize((width, height), Image.BILINEAR)
+        draw = ImageDraw.Draw(image)
+        for _ in range(self.random.randint(5, 25)):
+            x, y = self.random.randrange(width), self.random.randrange(height)
+            size = self.random.randint(width // 20, width // 3)
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            shape = self.random.choice([draw.ellipse, draw.rectangle])
+            shape([x, y, x + size, y + size // 2], fill=color)
+        image = image.filter(ImageFilter.GaussianBlur(width // 200))
+        # Зерно: шум в четверть размера, растянутый на всю картинку.
+        grain = (width // 4, height // 4)
+        noise = Image.frombytes('L', grain, bytes(
+            self.random.getrandbits(8) for _ in range(grain[0] * grain[1])
+        )).resize((width, height), Image.BICUBIC)
+        image = Image.blend(image, noise.convert('RGB'), 0.08)
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=85)
+        return buffer.getvalue()
+
+    def create_posts(self, user_ids, group_ids, images):
+        authors = zipf_weights(len(user_ids), self.options['exponent'])
+        groups = zipf_weights(len(group_ids), 1) if group_ids else None
+
+        def posts():
+            for _ in range(self.options['posts']):
+                group_id = None
+                if groups and self.random.random() < 0.8:
+                    group_id = self.random.choices(
+                        group_ids, cum_weights=groups)[0]
+                image = ''
+                if images and self.random.random() < self.options[
+                    'image_ratio'
+                ]:
+                    image = self.random.choice(images)
+                created = self.created()
+                self.post_times.append(created.timestamp())
+                yield Post(
+                    author_id=self.random.choices(
+                        user_ids, cum_weights=authors)[0],
+                    group_id=group_id,
+                    text=self.text(5, 80),
+                    image=image,
+                    created=created,
+                )
+
+        with explicit_created(Post):
+            return self.new_ids(Post, lambda: self.bulk_create(Post, posts()))
+
+    def create_comments(self, user_ids, post_ids):
+        if not post_ids:
+            return 0
+        # Обсуждают в основном немногие популярные посты.
+        popular = zipf_weights(len(post_ids), 0.8)
+        positions = range(len(post_ids))
+
+        def comments():
+            for _ in range(self.options['comments']):
+                position = self.random.choices(
+                    positions, cum_weights=popular)[0]
+                post_created = datetime.fromtimestamp(
+                    self.post_times[position], tz=timezone.utc
+                )
+                yield Comment(
+                    post_id=post_ids[position],
+                    author_id=self.random.choice(user_ids),
+                    text=self.text(2, 30),
+                    created=self.comment_created(post_created),
+                )
+
+        with explicit_created(Comment):
+            return self.bulk_create(Comment, comments())
+
+    def create_follows(self, user_ids):
+        """Подписки: на популярных авторов подписаны почти все."""
+        authors = zipf_weights(len(user_ids), self.options['exponent'])
+        # Не больше половины всех пар, иначе выборка с отказами
+        # на последних парах идёт слишком долго.
+        total = min(
+            self.options['follows'], len(user_ids) * (len(user_ids) - 1) // 2
+        )
+        seen = set()
+
+        def follows():
+            while len(seen) < total:
+                user_id = self.random.choice(user_ids)
+                author_id = self.random.choices(
+                    user_ids, cum_weights=authors)[0]
+                if user_id == author_id or (user_id, author_id) in seen:
+                    continue
+                seen.add((user_id, author_id))
+                yield Follow(user_id=user_id, author_id=author_id)
+
+        return self.bulk_create(Follow, follows())
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import AuthorStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику авторов с нуля.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько записей вставлять за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        total = AuthorStats.objects.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Статистика пересчитана: авторов {total}.')
+        )
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import counters, feeds, generations
+from posts.models import AuthorStats, FeedEntry, Follow
+
+
+class Command(BaseCommand):
+    help = ('Заново заполняет входящие ленты подписок '
+            'для режима fan-out-on-write. Авторы, у которых подписчиков '
+            'снова не больше FEED_FANOUT_MAX_FOLLOWERS, перестают '
+            'быть крупными.')
+
+    def handle(self, *args, **options):
+        if not feeds.fanout_enabled():
+            raise CommandError('FEED_FANOUT_ON_WRITE выключен.')
+        follows = Follow.objects.values_list('user_id', 'author_id')
+        total = 0
+        # Читатели видят старые ленты, пока новые не готовы целиком.
+        with transaction.atomic():
+            AuthorStats.objects.filter(
+                large=True,
+                followers__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+            ).update(large=False)
+            FeedEntry.objects.all().delete()
+            for user_id, author_id in follows.iterator():
+                feeds.backfill(user_id, author_id)
+                total += 1
+        # Счётчики и страницы лент подписок считались по старой таблице.
+        follow_feeds = [
+            counters.follow_feed(user_id)
+            for user_id in Follow.objects.values_list(
+                'user_id', flat=True
+            ).distinct()
+        ]
+        counters.forget_counts(follow_feeds)
+        generations.bump(follow_feeds)
+        self.stdout.write(
+            self.style.SUCCESS(f'Ленты заполнены: подписок {total}.')
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Строит поисковый индекс постов и комментариев заново: '
+            'после загрузки данных в обход сигналов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько документов индексировать за один раз.',
+        )
+
+    def handle(self, *args, **options):
+        total = search.rebuild(batch_size=options['batch_size'])
+        backend = 'FTS5' if search.fts_enabled() else 'таблицы'
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс построен ({backend}): документов {total}.'
+        ))
@@ -0,0 +1,48 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Строит недостающие миниатюры для картинок постов '
+            'и файлов в media/posts/ в несколько потоков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.POST_THUMBNAIL_WORKERS,
+            help='Число потоков; 1 — строить в текущем потоке.',
+        )
+
+    def image_names(self):
+        names = set(Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ))
+        storage = Post._meta.get_field('image').storage
+        if storage.exists('posts'):
+            _, files = storage.listdir('posts')
+            names.update(os.path.join('posts', name) for name in files)
+        return sorted(names)
+
+    def handle(self, *args, **options):
+        names = self.image_names()
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(options['workers']) as pool:
+                results = list(pool.map(self.generate, names))
+        else:
+            results = [self.generate(name) for name in names]
+        created = sum(results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок: {len(names)}, новых миниатюр: {created}.'
+        ))
+
+    def generate(self, name):
+        try:
+            return thumbnails.generate(name)
+        except Exception as error:
+            self.stderr.write(f'{name}: {error}')
+            return 0
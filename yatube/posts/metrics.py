@@ -0,0 +1,30 @@
+"""Метрики постов для /metrics/ (core.metrics)."""
+from core.metrics import registry
+
+POSTS_CREATED = registry.counter(
+    'yatube_posts_created_total', 'Посты, созданные на сайте.'
+)
+COMMENTS_CREATED = registry.counter(
+    'yatube_comments_created_total', 'Комментарии, оставленные на сайте.'
+)
+FOLLOWS_CREATED = registry.counter(
+    'yatube_follows_created_total', 'Новые подписки на авторов.'
+)
+# fragment: page — страница в cached_page, guest_page — готовая
+# страница гостю в PageCacheMiddleware, card — карточка поста.
+FRAGMENT_CACHE = registry.counter(
+    'yatube_fragment_cache_total',
+    'Обращения к кешу страниц и карточек: hit или miss.',
+)
+THUMBNAIL_SECONDS = registry.histogram(
+    'yatube_thumbnail_seconds', 'Время построения миниатюр одной картинки.'
+)
+THUMBNAILS_CREATED = registry.counter(
+    'yatube_thumbnails_created_total', 'Построенные миниатюры.'
+)
+THUMBNAIL_ERRORS = registry.counter(
+    'yatube_thumbnail_errors_total', 'Картинки, миниатюры которых не вышли.'
+)
+THUMBNAIL_QUEUE = registry.gauge(
+    'yatube_thumbnail_queue', 'Картинки в очереди пула миниатюр.'
+)
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_author_stats(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    sources = (
+        ('posts', 'Post', 'author', 'posts'),
+        ('posts', 'Comment', 'author', 'comments'),
+        ('posts', 'Follow', 'author', 'followers'),
+        ('posts', 'Follow', 'user', 'following'),
+    )
+    stats = {}
+    for app_label, model_name, author_field, stat_field in sources:
+        rows = apps.get_model(app_label, model_name).objects.values(
+            author_field
+        ).annotate(
+            total=models.Count('pk')
+        ).values_list(author_field, 'total').order_by()
+        for author_id, total in rows:
+            if author_id is not None:
+                stats.setdefault(author_id, {})[stat_field] = total
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(author_id=author_id, **fields)
+         for author_id, fields in stats.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'статистика автора',
+                'verbose_name_plural': 'статистика авторов',
+            },
+        ),
+        migrations.RunPython(fill_author_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='large',
+            field=models.BooleanField(default=False, verbose_name='Крупный автор'),
+        ),
+    ]
@@ -1,5 +1,6 @@
-from django.db import models
-from core.models import CreatedModel
+from django.db import models, transaction
+from core.models import AtomicSaveMixin, CreatedModel
+from core.storage import ContentAddressedStorage
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -14,7 +15,21 @@ class Group(models.Model):
         return self.title
 
 
-class Post(CreatedModel):
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для карточек ленты.
+
+        Автор и группа приходят в том же запросе, из таблиц читаются
+        только поля, которые выводит карточка.
+        """
+        return self.select_related('author', 'group').only(
+            'text', 'created', 'image', 'author_id', 'group_id',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__title', 'group__slug',
+        )
+
+
+class Post(AtomicSaveMixin, CreatedModel):
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Здесь можно написать новый пост!'
@@ -31,20 +46,30 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         help_text='Загрузите картинку',
     )
 
+    objects = PostQuerySet.as_manager()
+
     def __str__(self) -> str:
         return self.text[:15]
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['created'], name='post_created_idx'),
+            models.Index(fields=['author', 'created'],
+                         name='post_author_created_idx'),
+            models.Index(fields=['group', 'created'],
+                         name='post_group_created_idx'),
+        ]
         verbose_name = 'пост'
         verbose_name_plural = 'посты'
 
 
-class Comment(CreatedModel):
+class Comment(AtomicSaveMixin, CreatedModel):
     post = models.ForeignKey(
         Post,
         related_name='comments',
@@ -60,11 +85,15 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
         verbose_name = 'комментарий'
         verbose_name_plural = 'комментарии'
 
 
-class Follow(models.Model):
+class Follow(AtomicSaveMixin, models.Model):
     user = models.ForeignKey(
         User,
         related_name='follower',
@@ -80,8 +109,179 @@ class Follow(models.Model):
 
     class Meta:
         ordering = ['author']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
         verbose_name = 'подписка'
         verbose_name_plural = 'подписки'
 
     def __str__(self) -> str:
         return f'Подписка {self.user.username} на {self.author.username}'
+
+
+class FeedEntry(models.Model):
+    """Запись во входящей ленте подписчика (режим fan-out-on-write)."""
+    user = models.ForeignKey(
+        User,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+    )
+    created = models.DateTimeField('Дата поста')
+
+    class Meta:
+        ordering = ['-created']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created'],
+                         name='feed_entry_user_created_idx'),
+        ]
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи лент'
+
+    def __str__(self) -> str:
+        return f'Пост {self.post_id} в ленте {self.user_id}'
+
+
+class AuthorStatsManager(models.Manager):
+    def for_author(self, author):
+        """Статистика автора; для новых авторов — нули без записи в БД.
+
+        Принимает пользователя или его id.
+        """
+        author_id = getattr(author, 'pk', author)
+        try:
+            return self.get(author_id=author_id)
+        except self.model.DoesNotExist:
+            return self.model(author_id=author_id)
+
+    def change(self, author_id, **deltas):
+        """Сдвигает счётчики автора, например change(1, posts=1).
+
+        Вызывается из сигналов в транзакции самой записи
+        (core.models.AtomicSaveMixin).
+        """
+        if not author_id:
+            return
+        fields = {
+            field: models.F(field) + delta
+            for field, delta in deltas.items()
+        }
+        with transaction.atomic():
+            # Сначала UPDATE: SQLite сразу берёт блокировку на запись
+            # и ждёт её по busy_timeout. Транзакция, начатая чтением,
+            # при конкурентной записи не ждёт, а падает с «database
+            # is locked».
+            if self.filter(author_id=author_id).update(**fields):
+                return
+            # Уменьшаем только существующую запись: при удалении
+            # пользователя она уходит каскадом вместе с постами.
+            if any(delta > 0 for delta in deltas.values()):
+                self.get_or_create(author_id=author_id)
+                self.filter(author_id=author_id).update(**fields)
+
+    def rebuild(self, batch_size=1000):
+        """Пересчитывает статистику всех авторов с нуля."""
+        stats = {}
+
+        def collect(queryset, author_field, stat_field):
+            rows = queryset.values(author_field).annotate(
+                total=models.Count('pk')
+            ).values_list(author_field, 'total').order_by()
+            for author_id, total in rows:
+                if author_id is not None:
+                    stats.setdefault(author_id, {})[stat_field] = total
+
+        collect(Post.objects.all(), 'author', 'posts')
+        collect(Comment.objects.all(), 'author', 'comments')
+        collect(Follow.objects.all(), 'author', 'followers')
+        collect(Follow.objects.all(), 'user', 'following')
+        with transaction.atomic():
+            # Отметка крупного автора не пересчитывается из данных:
+            # её снимает только rebuild_follow_feeds.
+            large = set(self.filter(large=True).values_list(
+                'author_id', flat=True
+            ))
+            self.all().delete()
+            self.bulk_create(
+                (self.model(
+                    author_id=author_id, large=author_id in large, **fields
+                ) for author_id, fields in stats.items()),
+                batch_size=batch_size,
+            )
+        return len(stats)
+
+
+class AuthorStats(models.Model):
+    """Счётчики автора, которые поддерживаются при записи."""
+    author = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+    )
+    posts = models.PositiveIntegerField('Постов', default=0)
+    comments = models.PositiveIntegerField('Комментариев', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+    following = models.PositiveIntegerField('Подписок', default=0)
+    # См. posts.feeds.mark_large_author().
+    large = models.BooleanField('Крупный автор', default=False)
+
+    objects = AuthorStatsManager()
+
+    class Meta:
+        verbose_name = 'статистика автора'
+        verbose_name_plural = 'статистика авторов'
+
+    def __str__(self) -> str:
+        return f'Статистика {self.author_id}'
+
+
+class SearchDocument(models.Model):
+    """Пост или комментарий в поисковом индексе без FTS5.
+
+    id — posts.search.document_id(): номер поста или комментария
+    вместе с видом документа.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    post_id = models.PositiveIntegerField('Пост')
+    length = models.PositiveIntegerField('Число слов')
+
+    class Meta:
+        verbose_name = 'документ поиска'
+        verbose_name_plural = 'документы поиска'
+
+    def __str__(self) -> str:
+        return f'Документ {self.pk}'
+
+
+class SearchPosting(models.Model):
+    """Вхождение терма в документ: строка инвертированного индекса."""
+    term = models.CharField('Терм', max_length=40)
+    document = models.ForeignKey(
+        SearchDocument,
+        related_name='postings',
+        on_delete=models.CASCADE,
+    )
+    frequency = models.PositiveIntegerField('Вхождений')
+
+    class Meta:
+        # Индекс ограничения начинается с term: по нему и ищем.
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'document'],
+                                    name='unique_search_posting'),
+        ]
+        verbose_name = 'вхождение терма'
+        verbose_name_plural = 'вхождения термов'
+
+    def __str__(self) -> str:
+        return f'{self.term} в {self.document_id}'
@@ -0,0 +1,203 @@
+"""Кеш целых страниц лент и постов.
+
+Страница рендерится один раз на версию своих данных и хранится
+с «дырками» на месте частей, которые зависят от пользователя: меню
+в шапке, вкладки лент, кнопка подписки, кнопка редактирования
+и форма комментария. Гостю PageCacheMiddleware отдаёт готовую копию
+ещё до сессий, аутентификации и шаблонов. Вошедшему пользователю
+cached_page дорисовывает в ту же страницу только его фрагменты.
+"""
+import hashlib
+import re
+from functools import wraps
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from . import generations
+from .conditional import page_etag, patch_page_cache_control
+from .forms import CommentForm
+from .metrics import FRAGMENT_CACHE
+from .models import Follow
+
+PAGE_KEY: str = 'page:{}'
+MARKER = re.compile(r'<!--fragment:(\w+):([^>]*)-->')
+# Кешируются только страницы без параметров или с номером страницы.
+PAGE_PARAMS = {'page'}
+
+
+def _user_context(request, user, args):
+    return {'user': user, **args}
+
+
+def _follow_context(request, user, args):
+    following = user.is_authenticated and Follow.objects.filter(
+        user=user, author__username=args['author']
+    ).exists()
+    return {'user': user, 'author': args['author'], 'following': following}
+
+
+def _post_actions_context(request, user, args):
+    return {
+        'user': user,
+        'post_id': args['post_id'],
+        'is_author': str(user.pk) == args['author_id'],
+        'form': CommentForm(),
+    }
+
+
+# Имя фрагмента -> (шаблон, контекст по пользователю и аргументам).
+FRAGMENTS = {
+    'header': ('includes/header.html', _user_context),
+    'switcher': ('posts/includes/switcher.html', _user_context),
+    'follow_button': ('posts/includes/follow_button.html', _follow_context),
+    'post_actions': (
+        'posts/includes/post_actions.html', _post_actions_context
+    ),
+}
+
+
+def marker(name, args):
+    """Метка на месте фрагмента в закешированной странице."""
+    return f'<!--fragment:{name}:{urlencode(args)}-->'
+
+
+def render_fragment(name, request, user, args):
+    template_name, make_context = FRAGMENTS[name]
+    return render_to_string(
+        template_name, make_context(request, user, args), request=request
+    )
+
+
+def fill(content, request, user):
+    """Страница content с фрагментами пользователя user вместо меток."""
+    rendered = {}
+
+    def replace(match):
+        if match.group(0) not in rendered:
+            rendered[match.group(0)] = render_fragment(
+                match.group(1), request, user, dict(parse_qsl(match.group(2)))
+            )
+        return rendered[match.group(0)]
+
+    return MARKER.sub(replace, content)
+
+
+def is_cacheable(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and set(request.GET) <= PAGE_PARAMS
+    )
+
+
+def page_key(request):
+    url = f'{request.path}?page={request.GET.get("page", "")}'
+    return PAGE_KEY.format(hashlib.md5(url.encode()).hexdigest())
+
+
+def cached_page(view):
+    """Декоратор представления: страница из кеша с фрагментами
+    текущего пользователя.
+
+    Ставится под conditional_page: версию страницы даёт её Page.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        page = getattr(request, '_conditional_page', None)
+        if page is None or not is_cacheable(request):
+            return view(request, *args, **kwargs)
+        key = page_key(request)
+        version = generations.version(*page.scopes)
+        entry = cache.get(key)
+        if entry is not None and entry['version'] == version:
+            FRAGMENT_CACHE.inc(fragment='page', result='hit')
+            return HttpResponse(
+                fill(entry['content'], request, request.user),
+                content_type=entry['content_type'],
+            )
+        FRAGMENT_CACHE.inc(fragment='page', result='miss')
+        request.page_cache_holes = True
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            request.page_cache_holes = False
+        content = response.content.decode(response.charset)
+        response.content = fill(content, request, request.user)
+        if response.status_code == 200:
+            if request.user.is_authenticated:
+                anonymous = fill(content, request, AnonymousUser())
+            else:
+                anonymous = response.content.decode(response.charset)
+            cache.set(key, {
+                'version': version,
+                'scopes': page.scopes,
+                'content': content,
+                'anonymous': anonymous,
+                'content_type': response['Content-Type'],
+            }, settings.PAGE_CACHE_TIMEOUT)
+        return response
+    wrapper.page_cache = True
+    return wrapper
+
+
+class PageCacheMiddleware:
+    """Отдаёт гостям закешированные страницы.
+
+    Стоит перед SessionMiddleware: запрос без cookie сессии получает
+    страницу без сессии, пользователя, контекстных процессоров
+    и шаблонов. Остальные запросы идут дальше как обычно.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = None
+        if (
+            settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and is_cacheable(request)
+        ):
+            response = self.cached_response(request)
+        if response is None:
+            response = self.get_response(request)
+        return response
+
+    def cached_response(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if not getattr(match.func, 'page_cache', False):
+            return None
+        entry = cache.get(page_key(request))
+        if entry is None or (
+            generations.version(*entry['scopes']) != entry['version']
+        ):
+            FRAGMENT_CACHE.inc(fragment='guest_page', result='miss')
+            return None
+        FRAGMENT_CACHE.inc(fragment='guest_page', result='hit')
+        user = AnonymousUser()
+        # До аутентификации: у запроса ещё нет пользователя.
+        etag = page_etag(entry['version'], request)
+        last_modified = int(
+            generations.modified(entry['scopes'], lambda: None).timestamp()
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = HttpResponse(
+                entry['anonymous'], content_type=entry['content_type']
+            )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_page_cache_control(response, user)
+        patch_vary_headers(response, ('Cookie',))
+        return response
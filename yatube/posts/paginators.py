@@ -0,0 +1,170 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import lazy
+
+NEXT: str = 'n'
+PREVIOUS: str = 'p'
+
+
+def encode_cursor(obj, direction=NEXT):
+    """Непрозрачный курсор из пары (created, id) объекта."""
+    raw = f'{direction}|{obj.created.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор. Возвращает None, если курсор испорчен."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, created, pk = raw.split('|')
+        created = datetime.fromisoformat(created)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if direction not in (NEXT, PREVIOUS):
+        return None
+    return direction, created, pk
+
+
+def merge_querysets(parts):
+    """UNION нескольких выборок с одинаковыми полями."""
+    first, *rest = [part.order_by() for part in parts]
+    return first.union(*rest) if rest else first
+
+
+class CursorPage(Page):
+    """Страница, выбранная по курсору: без COUNT(*) и OFFSET."""
+
+    def __init__(self, object_list, paginator, cursor,
+                 has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self.cursor = cursor
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = None
+        self.previous_cursor = None
+        if object_list:
+            if has_next:
+                self.next_cursor = encode_cursor(object_list[-1], NEXT)
+            if has_previous:
+                self.previous_cursor = encode_cursor(
+                    object_list[0], PREVIOUS
+                )
+
+    def __repr__(self):
+        return f'<Page cursor={self.cursor}>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def start_index(self):
+        return None
+
+    def end_index(self):
+        return None
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (created, id).
+
+    Номера страниц (?page=) работают как раньше, через OFFSET.
+    Курсоры (?cursor=) выбирают страницу условием по ключу,
+    поэтому стоимость не зависит от глубины.
+
+    Вместо одной выборки можно передать список выборок: лента
+    соберётся из их объединения, а условие курсора применится
+    к каждой из них до UNION.
+    """
+    ordering = ('-created', '-pk')
+    pages_on_each_side: int = 3
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        self.parts = None
+        if isinstance(object_list, (list, tuple)):
+            self.parts = object_list
+            object_list = merge_querysets(object_list)
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs
+        )
+        if count is not None:
+            # Готовое число из счётчика вместо SELECT COUNT(*).
+            self.__dict__['count'] = count
+
+    def page(self, number):
+        page = super().page(number)
+        self._set_cursors(page)
+        page.page_window = self.page_window(page.number)
+        return page
+
+    def page_window(self, number):
+        """Номера страниц вокруг текущей вместо полного page_range."""
+        first = max(number - self.pages_on_each_side, 1)
+        last = min(number + self.pages_on_each_side, self.num_pages)
+        return range(first, last + 1)
+
+    def _set_cursors(self, page):
+        """Курсоры соседних страниц для обычной страницы.
+
+        Курсоры ленивые: запрос за постами страницы выполнится, только
+        когда курсор выведут. Страница из кеша фрагментов БД не трогает.
+        """
+        page.cursor = None
+        page.next_cursor = lazy(self._edge_cursor, str)(page, NEXT)
+        page.previous_cursor = lazy(self._edge_cursor, str)(page, PREVIOUS)
+
+    @staticmethod
+    def _edge_cursor(page, direction):
+        if not len(page):
+            return ''
+        if direction == NEXT:
+            return encode_cursor(page[len(page) - 1], NEXT)
+        return encode_cursor(page[0], PREVIOUS)
+
+    def _filter(self, condition):
+        if self.parts is None:
+            return self.object_list.filter(condition)
+        return merge_querysets(
+            [part.filter(condition) for part in self.parts]
+        )
+
+    def first_page(self):
+        """Первая страница без COUNT(*): проверяем только, есть ли ещё."""
+        objects = list(self.object_list[:self.per_page + 1])
+        return CursorPage(objects[:self.per_page], self, None,
+                          has_next=len(objects) > self.per_page,
+                          has_previous=False)
+
+    def cursor_page(self, cursor):
+        """Страница после (или до) позиции, закодированной в курсоре."""
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return self.page(1)
+        direction, created, pk = decoded
+        if direction == NEXT:
+            queryset = self._filter(
+                Q(created__lt=created) | Q(created=created, pk__lt=pk)
+            ).order_by(*self.ordering)
+        else:
+            queryset = self._filter(
+                Q(created__gt=created) | Q(created=created, pk__gt=pk)
+            ).order_by('created', 'pk')
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if direction == NEXT:
+            return CursorPage(objects, self, cursor,
+                              has_next=has_more, has_previous=True)
+        if not has_more:
+            # Дошли до начала ленты — отдаём обычную первую страницу.
+            return self.page(1)
+        objects.reverse()
+        return CursorPage(objects, self, cursor,
+                          has_next=True, has_previous=True)
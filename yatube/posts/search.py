@@ -0,0 +1,265 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Индекс хранит для каждого поста и комментария его термы
+(posts.stemmer) и обновляется сигналами при сохранении и удалении.
+Если SQLite собран с FTS5, индекс — виртуальная таблица FTS5
+и ранжирование делает её bm25(). Иначе используются обычные таблицы
+SearchDocument и SearchPosting, а BM25 считается в Python.
+В обоих случаях нужны все слова запроса.
+"""
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count, F
+
+from . import stemmer
+from .models import Comment, Post, SearchDocument, SearchPosting
+
+POST: int = 0
+COMMENT: int = 1
+FTS_TABLE: str = 'posts_search_fts'
+# Совпадение в тексте поста весит больше, чем в комментарии к нему.
+POST_WEIGHT: float = 2.0
+BM25_K1: float = 1.2
+BM25_B: float = 0.75
+
+# Имя БД -> есть ли в ней таблица FTS5.
+_fts_tables = {}
+
+
+def document_id(kind, pk):
+    """Номер документа индекса для поста или комментария pk."""
+    return pk * 2 + kind
+
+
+def fts_enabled():
+    if settings.POST_SEARCH_BACKEND == 'python':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        _fts_tables[name] = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_tables[name]
+
+
+class FtsIndex:
+    """Индекс в виртуальной таблице FTS5."""
+
+    def add(self, documents, replace=True):
+        documents = list(documents)
+        if replace:
+            self.remove([doc_id for doc_id, _, _ in documents])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, terms, post_id) '
+                f'VALUES (%s, %s, %s)',
+                [
+                    (doc_id, ' '.join(terms), post_id)
+                    for doc_id, post_id, terms in documents
+                ],
+            )
+
+    def remove(self, doc_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(doc_id,) for doc_id in doc_ids],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def match(self, terms, limit):
+        # Термы состоят только из букв и цифр, кавычки их не ломают.
+        query = ' '.join(f'"{term}"' for term in set(terms))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, post_id, -bm25({FTS_TABLE}) '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY rank LIMIT %s',
+                [query, limit],
+            )
+            return cursor.fetchall()
+
+    def filter(self, queryset, terms, kind):
+        query = ' '.join(f'"{term}"' for term in terms)
+        pk = queryset.model._meta.pk.get_attname_column()[1]
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            where=[
+                f'"{table}"."{pk}" IN (SELECT rowid / 2 FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid %% 2 = %s)'
+            ],
+            params=[query, kind],
+        )
+
+
+class TableIndex:
+    """Инвертированный индекс в таблицах SearchDocument и SearchPosting."""
+
+    def add(self, documents, replace=True):
+        documents = list(documents)
+        if replace:
+            self.remove([doc_id for doc_id, _, _ in documents])
+        SearchDocument.objects.bulk_create(
+            SearchDocument(id=doc_id, post_id=post_id, length=len(terms))
+            for doc_id, post_id, terms in documents
+        )
+        SearchPosting.objects.bulk_create(
+            SearchPosting(document_id=doc_id, term=term, frequency=frequency)
+            for doc_id, _, terms in documents
+            for term, frequency in Counter(terms).items()
+        )
+
+    def remove(self, doc_ids):
+        SearchPosting.objects.filter(document_id__in=doc_ids).delete()
+        SearchDocument.objects.filter(id__in=doc_ids).delete()
+
+    def clear(self):
+        SearchPosting.objects.all().delete()
+        SearchDocument.objects.all().delete()
+
+    def match(self, terms, limit):
+        terms = set(terms)
+        postings = SearchPosting.objects.filter(term__in=terms).values_list(
+            'term', 'document_id', 'frequency',
+            'document__post_id', 'document__length',
+        )
+        found = defaultdict(dict)
+        documents = {}
+        for term, doc_id, frequency, post_id, length in postings:
+            found[doc_id][term] = frequency
+            documents[doc_id] = (post_id, length)
+        if not found:
+            return []
+        stats = SearchDocument.objects.aggregate(
+            total=Count('pk'), average=Avg('length')
+        )
+        frequencies = Counter(
+            term for doc_terms in found.values() for term in doc_terms
+        )
+        scores = []
+        for doc_id, doc_terms in found.items():
+            if len(doc_terms) < len(terms):
+                continue
+            post_id, length = documents[doc_id]
+            norm = BM25_K1 * (
+                1 - BM25_B + BM25_B * length / (stats['average'] or 1)
+            )
+            score = 0
+            for term, frequency in doc_terms.items():
+                idf = math.log(1 + (
+                    (stats['total'] - frequencies[term] + 0.5)
+                    / (frequencies[term] + 0.5)
+                ))
+                score += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+            scores.append((doc_id, post_id, score))
+        scores.sort(key=lambda row: (-row[2], -row[0]))
+        return scores[:limit]
+
+    def filter(self, queryset, terms, kind):
+        return queryset.filter(pk__in=SearchPosting.objects.annotate(
+            kind=F('document_id') % 2
+        ).filter(term__in=terms, kind=kind).values('document_id').annotate(
+            found=Count('term')
+        ).filter(found=len(terms)).annotate(
+            object_id=F('document_id') / 2
+        ).values('object_id'))
+
+
+def get_index():
+    return FtsIndex() if fts_enabled() else TableIndex()
+
+
+def index_post(post):
+    get_index().add([
+        (document_id(POST, post.pk), post.pk, stemmer.terms(post.text))
+    ])
+
+
+def index_comment(comment):
+    get_index().add([(
+        document_id(COMMENT, comment.pk),
+        comment.post_id,
+        stemmer.terms(comment.text),
+    )])
+
+
+def remove_post(post_id):
+    get_index().remove([document_id(POST, post_id)])
+
+
+def remove_comment(comment_id):
+    get_index().remove([document_id(COMMENT, comment_id)])
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def rebuild(batch_size=1000):
+    """Строит индекс заново по всем постам и комментариям."""
+    index = get_index()
+    total = 0
+    posts = Post.objects.values_list('pk', 'text').order_by()
+    comments = Comment.objects.values_list(
+        'pk', 'post_id', 'text'
+    ).order_by()
+    # Одна транзакция: SQLite не фиксирует на диск каждую пачку.
+    with transaction.atomic():
+        index.clear()
+        for batch in _batches(posts.iterator(), batch_size):
+            index.add((
+                (document_id(POST, pk), pk, stemmer.terms(text))
+                for pk, text in batch
+            ), replace=False)
+            total += len(batch)
+        for batch in _batches(comments.iterator(), batch_size):
+            index.add((
+                (document_id(COMMENT, pk), post_id, stemmer.terms(text))
+                for pk, post_id, text in batch
+            ), replace=False)
+            total += len(batch)
+    return total
+
+
+def matches(query):
+    """Документы, где есть все слова запроса: (номер, пост, оценка)."""
+    terms = stemmer.terms(query)
+    if not terms:
+        return []
+    return get_index().match(terms, settings.POST_SEARCH_MAX_RESULTS)
+
+
+def post_ids(query):
+    """Посты по запросу, лучшие первыми.
+
+    Оценка поста — сумма оценок его текста и комментариев к нему.
+    """
+    scores = defaultdict(float)
+    for doc_id, post_id, score in matches(query):
+        weight = POST_WEIGHT if doc_id % 2 == POST else 1
+        scores[post_id] += score * weight
+    return sorted(scores, key=lambda pk: (-scores[pk], -pk))
+
+
+def filter_queryset(queryset, query, kind):
+    """Посты (kind=POST) или комментарии (kind=COMMENT) из queryset,
+    в собственном тексте которых есть все слова запроса. Без оценки
+    и ограничения числа — для админки."""
+    terms = set(stemmer.terms(query))
+    if not terms:
+        return queryset.none()
+    return get_index().filter(queryset, terms, kind)
@@ -0,0 +1,209 @@
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import counters, feeds, generations, search, thumbnails
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+# Поля пользователя, которые видны в карточках его постов.
+CARD_USER_FIELDS = ('first_name', 'last_name')
+
+
+def follower_ids(author_id):
+    return list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+
+
+def feed_follower_ids(author_id):
+    """Подписчики, чьи счётчики и поколения лент сдвигает пост автора.
+
+    Ленты подписчиков крупного автора учитывают его посты при чтении
+    (feeds.follow_feed_scopes), так что их не перебираем.
+    """
+    if feeds.is_large_author(author_id):
+        return []
+    return follower_ids(author_id)
+
+
+def author_became_large(author_id):
+    """Счётчики лент подписчиков считали посты автора, а теперь
+    их число берётся из статистики: сбрасываем счётчики и поколения
+    лент подписчиков. Бывает один раз на автора."""
+    follow_feeds = [
+        counters.follow_feed(user_id) for user_id in follower_ids(author_id)
+    ]
+    counters.forget_counts(follow_feeds)
+    generations.bump(follow_feeds)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw, **kwargs):
+    """Запоминает прежнюю группу редактируемого поста."""
+    instance._previous_group_id = None
+    if instance.pk and not raw:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    followers = feed_follower_ids(instance.author_id)
+    scopes = generations.post_scopes(instance, followers)
+    if created:
+        counters.change_counts(counters.post_feeds(instance, followers), 1)
+        AuthorStats.objects.change(instance.author_id, posts=1)
+        feeds.fan_out(instance)
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if not created and previous_group_id != instance.group_id:
+        if previous_group_id:
+            counters.change_counts(
+                [counters.group_feed(previous_group_id)], -1
+            )
+            scopes.append(counters.group_feed(previous_group_id))
+        if instance.group_id:
+            counters.change_counts(
+                [counters.group_feed(instance.group_id)], 1
+            )
+    generations.bump(scopes)
+    thumbnails.schedule(instance, scopes)
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    followers = feed_follower_ids(instance.author_id)
+    counters.change_counts(counters.post_feeds(instance, followers), -1)
+    AuthorStats.objects.change(instance.author_id, posts=-1)
+    generations.bump(generations.post_scopes(instance, followers))
+    search.remove_post(instance.pk)
+
+
+@receiver(pre_save, sender=User)
+def remember_user_name(sender, instance, raw, update_fields, **kwargs):
+    """Запоминает прежнее имя пользователя."""
+    instance._previous_name = None
+    # Вход сохраняет только last_login: лишний запрос не нужен.
+    if update_fields is not None and not (
+        set(update_fields) & set(CARD_USER_FIELDS)
+    ):
+        return
+    if instance.pk and not raw:
+        instance._previous_name = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*CARD_USER_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw, **kwargs):
+    previous = getattr(instance, '_previous_name', None)
+    if raw or created or previous is None:
+        return
+    if previous == tuple(
+        getattr(instance, field) for field in CARD_USER_FIELDS
+    ):
+        return
+    group_ids = Post.objects.filter(author=instance).exclude(
+        group=None
+    ).values_list('group_id', flat=True).distinct()
+    generations.bump(generations.author_scopes(
+        instance.pk, feed_follower_ids(instance.pk), group_ids
+    ))
+
+
+def group_posts_scopes(group_id):
+    """Поколения лент, где рядом с постами группы есть ссылка на неё."""
+    author_ids = Post.objects.filter(group_id=group_id).values_list(
+        'author_id', flat=True
+    ).distinct()
+    scopes = [counters.index_feed(), counters.group_feed(group_id)]
+    for author_id in author_ids:
+        scopes.append(counters.author_feed(author_id))
+        scopes.extend(
+            counters.follow_feed(user_id)
+            for user_id in feed_follower_ids(author_id)
+        )
+    return scopes
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, raw, **kwargs):
+    """Запоминает прежний slug группы."""
+    instance._previous_slug = None
+    if instance.pk and not raw:
+        instance._previous_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw, **kwargs):
+    if raw or created:
+        return
+    previous_slug = getattr(instance, '_previous_slug', None)
+    if previous_slug is not None and previous_slug != instance.slug:
+        # Ссылки на группу в лентах ведут на старый slug.
+        generations.bump(group_posts_scopes(instance.pk))
+    else:
+        # Название и описание группы входят в закешированную страницу.
+        generations.bump([counters.group_feed(instance.pk)])
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_scopes(sender, instance, **kwargs):
+    # После удаления у постов уже не будет группы (SET_NULL),
+    # поэтому ленты собираем заранее.
+    instance._posts_scopes = group_posts_scopes(instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    generations.bump(getattr(
+        instance, '_posts_scopes', [counters.group_feed(instance.pk)]
+    ))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        AuthorStats.objects.change(instance.author_id, comments=1)
+    generations.bump([generations.post_scope(instance.post_id)])
+    search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    AuthorStats.objects.change(instance.author_id, comments=-1)
+    generations.bump([generations.post_scope(instance.post_id)])
+    search.remove_comment(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if instance.user_id:
+        counters.forget_counts([counters.follow_feed(instance.user_id)])
+        generations.bump([counters.follow_feed(instance.user_id)])
+    if created:
+        AuthorStats.objects.change(instance.author_id, followers=1)
+        AuthorStats.objects.change(instance.user_id, following=1)
+        if feeds.mark_large_author(instance.author_id):
+            author_became_large(instance.author_id)
+        feeds.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if instance.user_id:
+        counters.forget_counts([counters.follow_feed(instance.user_id)])
+        generations.bump([counters.follow_feed(instance.user_id)])
+    AuthorStats.objects.change(instance.author_id, followers=-1)
+    AuthorStats.objects.change(instance.user_id, following=-1)
+    feeds.prune(instance.user_id, instance.author_id)
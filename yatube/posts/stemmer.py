@@ -0,0 +1,160 @@
+"""Слова текста для поискового индекса.
+
+Текст режется на слова, из них выбрасываются служебные, а русские
+слова приводятся к основе стеммером Портера (Snowball) для русского
+языка, чтобы «посты», «постов» и «постами» находились одним запросом.
+Слова на других языках только переводятся в нижний регистр.
+"""
+import re
+from functools import lru_cache
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile(r'^[а-я]+$')
+VOWELS = 'аеиоуыэюя'
+# Слова длиннее не индексируем: это ссылки, хеши и прочий мусор.
+MAX_WORD_LENGTH: int = 40
+
+STOP_WORDS = frozenset('''
+    а без более бы был была были было быть в вам вас весь во вот все
+    всего всех вы где да даже для до его ее если есть еще же за и из
+    или им их к как ко когда кто ли либо мне может мы на над нам нас
+    не него нее нет ни них но ну о об однако он она они оно от очень
+    по под при с со так также такой там те тем то того тоже той только
+    том ты у уже хотя чего чей чем что чтобы чье чья эта эти это я
+'''.split())
+
+# Окончания по группам алгоритма. Окончания первой группы снимаются,
+# только если перед ними стоит «а» или «я».
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = ((), (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+     'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = ((), (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+))
+SUPERLATIVE = ((), ('ейше', 'ейш'))
+DERIVATIONAL = ((), ('ость', 'ост'))
+
+
+def _region_after_vowel_consonant(word, start):
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip(word, start, endings):
+    """word без самого длинного окончания из endings, которое целиком
+    лежит после позиции start, или None."""
+    preceded, plain = endings
+    found = None
+    for ending in preceded + plain:
+        if (
+            word.endswith(ending)
+            and len(word) - len(ending) >= start
+            and (found is None or len(ending) > len(found))
+        ):
+            found = ending
+    if found is None:
+        return None
+    stem = word[:-len(found)]
+    if found in preceded and found not in plain:
+        if len(stem) <= start or stem[-1] not in 'ая':
+            return None
+    return stem
+
+
+def _rv(word):
+    """Начало области RV: после первой гласной."""
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _step1(word, rv):
+    """Деепричастие или возвратная частица и одно из окончаний
+    прилагательного, глагола, существительного."""
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    word = _strip(word, rv, REFLEXIVE) or word
+    stripped = _strip(word, rv, ADJECTIVE)
+    if stripped is not None:
+        return _strip(stripped, rv, PARTICIPLE) or stripped
+    stripped = _strip(word, rv, VERB)
+    if stripped is None:
+        stripped = _strip(word, rv, NOUN)
+    return word if stripped is None else stripped
+
+
+def _step2(word, rv):
+    if word.endswith('и') and len(word) - 1 >= rv:
+        return word[:-1]
+    return word
+
+
+def _step3(word, r2):
+    """Словообразовательный суффикс в R2."""
+    return _strip(word, r2, DERIVATIONAL) or word
+
+
+def _undouble_n(word, rv):
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    return word
+
+
+def _step4(word, rv):
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    stripped = _strip(word, rv, SUPERLATIVE)
+    if stripped is not None:
+        return _undouble_n(stripped, rv)
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        return word[:-1]
+    return word
+
+
+# Словарь текстов невелик: большинство слов уже встречались.
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Основа русского слова по алгоритму Snowball."""
+    rv = _rv(word)
+    r2 = _region_after_vowel_consonant(
+        word, _region_after_vowel_consonant(word, 0)
+    )
+    word = _step1(word, rv)
+    word = _step2(word, rv)
+    word = _step3(word, r2)
+    return _step4(word, rv)
+
+
+def terms(text):
+    """Поисковые термы текста в порядке появления, с повторами."""
+    found = []
+    for word in WORD.findall(text.lower().replace('ё', 'е')):
+        if word in STOP_WORDS or len(word) > MAX_WORD_LENGTH:
+            continue
+        found.append(stem(word) if CYRILLIC.match(word) else word)
+    return found
@@ -0,0 +1,23 @@
+from django import template
+from django.contrib.auth.models import AnonymousUser
+from django.utils.safestring import mark_safe
+
+from posts import pagecache
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def fragment(context, name, **args):
+    '''Часть страницы, которая зависит от пользователя.
+
+    Когда страница рендерится для кеша, вместо фрагмента выводится
+    метка, которую pagecache.fill заменит фрагментом для каждого
+    запроса. Аргументы попадают в метку, поэтому это должны быть
+    простые значения, одинаковые для всех пользователей.'''
+    args = {key: str(value) for key, value in args.items()}
+    request = context.get('request')
+    if getattr(request, 'page_cache_holes', False):
+        return mark_safe(pagecache.marker(name, args))
+    user = context.get('user') or AnonymousUser()
+    return mark_safe(pagecache.render_fragment(name, request, user, args))
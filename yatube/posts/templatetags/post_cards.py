@@ -0,0 +1,61 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import generations, thumbnails
+from posts.metrics import FRAGMENT_CACHE
+
+register = template.Library()
+
+CARD_KEY: str = 'post_card:{}:{}'
+CARD_TEMPLATE: str = 'posts/includes/post_card.html'
+CARD_TIMEOUT: int = 60 * 60 * 24
+
+
+@register.simple_tag
+def post_cards(posts):
+    '''Пары (пост, HTML карточки) для всей страницы.
+
+    Версии постов и готовые карточки читаются из кеша двумя
+    запросами get_many, шаблон рендерится только для промахов.
+    Миниатюры для промахов читаются одним пакетом.'''
+    posts = list(posts)
+    # Карточка зависит от поста и от имени автора.
+    versions = generations.current({
+        scope for post in posts for scope in (
+            generations.post_scope(post.pk),
+            generations.user_scope(post.author_id),
+        )
+    })
+    keys = {
+        post.pk: CARD_KEY.format(post.pk, '{}.{}'.format(
+            versions[generations.post_scope(post.pk)],
+            versions[generations.user_scope(post.author_id)],
+        ))
+        for post in posts
+    }
+    cached = cache.get_many(keys.values())
+    missed = [post for post in posts if keys[post.pk] not in cached]
+    FRAGMENT_CACHE.inc(
+        len(posts) - len(missed), fragment='card', result='hit'
+    )
+    FRAGMENT_CACHE.inc(len(missed), fragment='card', result='miss')
+    # Миниатюры карточек, которые придётся рендерить, читаем пачкой.
+    prefetched = thumbnails.prefetch(
+        [post.image for post in missed], thumbnails.card_names()
+    )
+    rendered = {}
+    cards = []
+    for post in posts:
+        key = keys[post.pk]
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'thumbnails': prefetched}
+            )
+            rendered[key] = card
+        cards.append((post, mark_safe(card)))
+    if rendered:
+        cache.set_many(rendered, CARD_TIMEOUT)
+    return cards
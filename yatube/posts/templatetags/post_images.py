@@ -0,0 +1,20 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html', takes_context=True)
+def post_picture(context, image):
+    '''Разметка <picture> для картинки поста.
+
+    Миниатюры строятся в фоне после сохранения поста, поэтому
+    шаблон картинку не уменьшает: пока миниатюр нет, выводим
+    исходный файл. Если страница заранее прочитала миниатюры
+    через thumbnails.prefetch, берём их из context['thumbnails'].'''
+    if not image:
+        return {'picture': None}
+    return {
+        'picture': thumbnails.picture(image, context.get('thumbnails')),
+    }
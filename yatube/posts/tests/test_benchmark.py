@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from .. import benchmark
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class BenchmarkTest(TestCase):
+    databases = {'default', 'replica1'}
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 0.5), 50)
+        self.assertEqual(benchmark.percentile(values, 0.99), 99)
+        self.assertEqual(benchmark.percentile([7], 0.95), 7)
+        self.assertEqual(benchmark.percentile([], 0.5), 0)
+
+    def test_measure_counts_queries_and_rows(self):
+        author = User.objects.create_user('author')
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {i}') for i in range(5)
+        )
+        _, measure = benchmark.measure(lambda: list(Post.objects.all()))
+        self.assertEqual(measure.queries, 1)
+        self.assertEqual(measure.rows, 5)
+        self.assertGreater(measure.seconds, 0)
+
+    def test_measure_counts_replica_queries(self):
+        User.objects.db_manager('replica1').create_user('reader')
+        _, measure = benchmark.measure(
+            lambda: list(User.objects.using('replica1').all())
+        )
+        self.assertEqual(measure.queries, 1)
+        self.assertEqual(measure.rows, 1)
+
+    def test_compare(self):
+        scenario = {
+            'p95_ms': 10.0, 'p99_ms': 12.0,
+            'queries_max': 3, 'rows_mean': 20.0,
+        }
+        baseline = {'scenarios': {'index': scenario}}
+        same = {'scenarios': {'index': dict(scenario, p95_ms=11.0)}}
+        self.assertEqual(benchmark.compare(same, baseline), [])
+        worse = {'scenarios': {'index': dict(
+            scenario, p99_ms=30.0, queries_max=4, rows_mean=40.0
+        )}}
+        self.assertEqual(len(benchmark.compare(worse, baseline)), 3)
+
+
+class BenchmarkCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        group = Group.objects.create(title='Группа', slug='group')
+        for i in range(3):
+            author = User.objects.create_user(f'author-{i}')
+            for j in range(3):
+                Post.objects.create(
+                    author=author, group=group, text=f'Пост {i} {j}'
+                )
+
+    def setUp(self):
+        handle, self.output = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, self.output)
+
+    def benchmark(self, **options):
+        call_command(
+            'benchmark_urls', requests=3, warmup=1, output=self.output,
+            stdout=StringIO(), **options
+        )
+        with open(self.output, encoding='utf-8') as file:
+            return json.load(file)
+
+    def test_all_routes_measured(self):
+        follows = Follow.objects.count()
+        results = self.benchmark()
+        self.assertEqual(len(results['scenarios']), 10)
+        for name, scenario in results['scenarios'].items():
+            with self.subTest(name=name):
+                self.assertEqual(scenario['requests'], 3)
+                self.assertIn(scenario['statuses'], ([200], [302]))
+                self.assertLessEqual(scenario['p50_ms'], scenario['p99_ms'])
+        # Читатель удаляется вместе с постами, комментариями и подписками.
+        self.assertFalse(User.objects.filter(
+            username__startswith='benchmark'
+        ).exists())
+        self.assertEqual(Post.objects.count(), 9)
+        self.assertEqual(Follow.objects.count(), follows)
+
+    def test_regression_fails(self):
+        results = self.benchmark(scenario=['post_detail'], cold=True)
+        results['scenarios']['post_detail']['queries_max'] = 0
+        baseline = self.output + '.baseline'
+        with open(baseline, 'w', encoding='utf-8') as file:
+            json.dump(results, file)
+        self.addCleanup(os.remove, baseline)
+        with self.assertRaisesMessage(CommandError, 'запросов к БД'):
+            self.benchmark(
+                scenario=['post_detail'], cold=True, baseline=baseline
+            )
@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.contrib.auth import get_user_model
 from posts.forms import PostForm
@@ -8,6 +9,7 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 User = get_user_model()
 
@@ -68,14 +70,14 @@ class PostFormTests(TestCase):
         self.assertRedirects(response, reverse(
             'posts:profile', kwargs={'username': self.author.username}))
         self.assertEqual(Post.objects.count(), posts_count + 1)
-        self.assertTrue(
-            Post.objects.filter(
-                group=form_data['group'],
-                text=form_data['text'],
-                author=self.author,
-                image='posts/small.gif'
-            )
+        post = Post.objects.get(
+            group=form_data['group'],
+            text=form_data['text'],
+            author=self.author,
         )
+        # Картинка хранится под SHA-256 своего содержимого.
+        self.assertRegex(post.image.name, r'^posts/[0-9a-f]{64}\.gif$')
+        self.assertTrue(post.image.storage.exists(post.image.name))
 
     def test_post_edit(self):
         """Валидная форма изменяет запись в Post."""
@@ -101,3 +103,62 @@ class PostFormTests(TestCase):
                 author=self.author
             )
         )
+
+
+class PostFormImageTests(TestCase):
+    @staticmethod
+    def upload(name, image, image_format, **params):
+        buffer = BytesIO()
+        image.save(buffer, format=image_format, **params)
+        return SimpleUploadedFile(name=name, content=buffer.getvalue())
+
+    def clean_image(self, upload):
+        form = PostForm(data={'text': 'Тест'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        return Image.open(form.cleaned_data['image'])
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 50)
+    def test_large_image_scaled_down_without_metadata(self):
+        """Большая картинка уменьшается, EXIF отбрасывается,
+        ориентация применяется к пикселям."""
+        exif = Image.Exif()
+        # Orientation: повернуть на 90°.
+        exif[0x0112] = 6
+        upload = self.upload(
+            'photo.jpg', Image.new('RGB', (800, 400), 'red'), 'JPEG',
+            exif=exif.tobytes(),
+        )
+        image = self.clean_image(upload)
+        self.assertEqual(image.format, 'JPEG')
+        self.assertLessEqual(image.width * image.height, 100 * 50)
+        self.assertLess(image.width, image.height)
+        self.assertNotIn('exif', image.info)
+
+    def test_animated_gif_keeps_first_frame(self):
+        frames = [Image.new('P', (20, 10), color) for color in (1, 2, 3)]
+        buffer = BytesIO()
+        frames[0].save(buffer, format='GIF', save_all=True,
+                       append_images=frames[1:], duration=100, loop=0)
+        upload = SimpleUploadedFile(name='anim.gif', content=buffer.getvalue())
+        image = self.clean_image(upload)
+        self.assertEqual(image.format, 'GIF')
+        self.assertEqual(getattr(image, 'n_frames', 1), 1)
+        self.assertEqual(image.size, (20, 10))
+
+    def test_unknown_format_reencoded(self):
+        form = PostForm(data={'text': 'Тест'}, files={'image': self.upload(
+            'picture.bmp', Image.new('RGB', (10, 10)), 'BMP'
+        )})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['image'].name, 'picture.jpg')
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_too_large_file_rejected(self):
+        upload = self.upload(
+            'noise.png', Image.effect_noise((100, 100), 50), 'PNG'
+        )
+        form = PostForm(data={'text': 'Тест'}, files={'image': upload})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors.as_data()['image'][0].code, 'file_too_large'
+        )
@@ -1,7 +1,19 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, models
+from django.test import TestCase, override_settings
 
-from ..models import Group, Post
+from .. import counters, thumbnails
+from ..models import AuthorStats, Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -32,3 +44,336 @@ class PostModelTest(TestCase):
         group = PostModelTest.group
         expected_object_name = group.title
         self.assertEqual(expected_object_name, str(group))
+
+
+class FeedCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Другое описание',
+        )
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.feeds = {
+            counters.index_feed(): Post.objects.all(),
+            counters.group_feed(self.group.pk): self.group.posts.all(),
+            counters.follow_feed(self.follower.pk): Post.objects.filter(
+                author__following__user=self.follower),
+        }
+        for feed, post_list in self.feeds.items():
+            counters.feed_count(feed, post_list)
+
+    def assertCountsMatch(self):
+        for feed, post_list in self.feeds.items():
+            with self.subTest(feed=feed):
+                with self.assertNumQueries(0):
+                    count = counters.feed_count(feed, post_list)
+                self.assertEqual(count, post_list.count())
+
+    def test_counts_follow_created_and_deleted_posts(self):
+        """Счётчики лент меняются при создании и удалении поста."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост')
+        self.assertCountsMatch()
+        post.delete()
+        self.assertCountsMatch()
+
+    def test_counts_follow_group_change(self):
+        """Перенос поста в другую группу меняет счётчики групп."""
+        post = Post.objects.create(
+            author=self.author, group=self.other_group, text='Пост')
+        post.group = self.group
+        post.save()
+        self.assertCountsMatch()
+
+    @override_settings(FEED_COUNT_TIMEOUT=1)
+    def test_counts_reconcile_after_timeout(self):
+        """Счётчик, сбитый записью в обход сигналов, пересчитывается."""
+        cache.clear()
+        feed = counters.index_feed()
+        self.assertEqual(counters.feed_count(feed, Post.objects.all()), 0)
+        Post.objects.bulk_create([Post(author=self.author, text='Пост')])
+        self.assertEqual(counters.feed_count(feed, Post.objects.all()), 0)
+        time.sleep(1.1)
+        self.assertEqual(counters.feed_count(feed, Post.objects.all()), 1)
+
+    def test_follow_resets_follow_feed_count(self):
+        """Подписка сбрасывает счётчик ленты подписок."""
+        Post.objects.create(author=self.follower, text='Пост')
+        Follow.objects.create(user=self.author, author=self.follower)
+        self.assertIsNone(cache.get(
+            counters.COUNT_KEY.format(counters.follow_feed(self.author.pk))
+        ))
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def assertStats(self, user, **expected):
+        stats = AuthorStats.objects.for_author(user)
+        for field, value in expected.items():
+            with self.subTest(user=user.username, field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_stats_follow_writes(self):
+        """Статистика автора меняется вместе с постами,
+        комментариями и подписками."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(author=self.reader, post=post, text='Текст')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertStats(self.author, posts=1, comments=0, followers=1)
+        self.assertStats(self.reader, posts=0, comments=1, following=1)
+        follow.delete()
+        post.delete()
+        self.assertStats(self.author, posts=0, followers=0)
+        self.assertStats(self.reader, comments=0, following=0)
+
+    def test_failed_write_keeps_stats(self):
+        """Строка и статистика сохраняются вместе или не сохраняются."""
+        def fail(sender, **kwargs):
+            raise DatabaseError('database is locked')
+
+        models.signals.post_save.connect(fail, sender=Post)
+        try:
+            with self.assertRaises(DatabaseError):
+                Post.objects.create(author=self.author, text='Пост')
+        finally:
+            models.signals.post_save.disconnect(fail, sender=Post)
+        self.assertFalse(Post.objects.filter(author=self.author))
+        self.assertStats(self.author, posts=0)
+
+    def test_rebuild_restores_stats(self):
+        """rebuild пересчитывает статистику по данным в БД."""
+        Post.objects.create(author=self.author, text='Пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.all().delete()
+        AuthorStats.objects.rebuild()
+        self.assertStats(self.author, posts=1, followers=1)
+        self.assertStats(self.reader, following=1)
+
+    def test_deleting_author_drops_stats(self):
+        """Удаление пользователя удаляет и его статистику."""
+        user = User.objects.create_user(username='temporary')
+        Post.objects.create(author=user, text='Пост')
+        user.delete()
+        self.assertFalse(AuthorStats.objects.filter(author_id=user.pk))
+
+
+class FeedIndexesTest(TestCase):
+    """Запросы лент и комментариев идут по индексам."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+
+    def assertUsesIndex(self, queryset, table, index_name=''):
+        """Таблица table читается по индексу (index_name, если задан)."""
+        plan = queryset.explain()
+        pattern = (rf'(SEARCH|SCAN)( TABLE)? {table} '
+                   rf'USING (COVERING )?INDEX {index_name}')
+        self.assertRegex(plan, pattern)
+
+    def test_queries_use_indexes(self):
+        """Каждый запрос из posts/views.py выбирает строки по индексу."""
+        ordering = ('-created', '-pk')
+        feed = Post.objects.for_feed().order_by(*ordering)
+        queries = {
+            'index': (
+                feed[:11],
+                {'posts_post': 'post_created_idx'}
+            ),
+            'index_cursor': (
+                feed.filter(created__lt=self.post.created)[:11],
+                {'posts_post': 'post_created_idx'}
+            ),
+            'group_posts': (
+                feed.filter(group=self.group)[:11],
+                {'posts_post': 'post_group_created_idx'}
+            ),
+            'profile': (
+                feed.filter(author=self.author)[:11],
+                {'posts_post': 'post_author_created_idx'}
+            ),
+            'follow_index': (
+                feed.filter(author__following__user=self.reader)[:11],
+                {'posts_follow': '',
+                 'posts_post': 'post_author_created_idx'}
+            ),
+            'post_detail_comments': (
+                self.post.comments.order_by(*ordering)[:21],
+                {'posts_comment': 'comment_post_created_idx'}
+            ),
+            'profile_following': (
+                Follow.objects.filter(user=self.reader, author=self.author),
+                {'posts_follow': ''}
+            ),
+        }
+        for name, (queryset, indexes) in queries.items():
+            for table, index_name in indexes.items():
+                with self.subTest(query=name, table=table):
+                    self.assertUsesIndex(queryset, table, index_name)
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на автора невозможна."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=self.reader, author=self.author)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
+class MediaGarbageCollectionTest(TestCase):
+    SMALL_GIF = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_post(self, content):
+        return Post.objects.create(
+            author=self.author,
+            text='Пост',
+            image=ContentFile(content, name='image.gif'),
+        )
+
+    def test_duplicate_uploads_share_file_and_thumbnails(self):
+        first = self.create_post(self.SMALL_GIF)
+        second = self.create_post(self.SMALL_GIF)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertGreater(thumbnails.generate(first.image.name), 0)
+        self.assertEqual(thumbnails.generate(second.image.name), 0)
+
+    def test_gc_removes_orphaned_files_and_thumbnails(self):
+        kept = self.create_post(self.SMALL_GIF)
+        orphan = self.create_post(self.SMALL_GIF + b'orphan')
+        thumbnails.generate(orphan.image.name)
+        orphan_thumbnail = thumbnails.lookup(orphan.image, 'card')
+        orphan_name = orphan.image.name
+        storage = orphan.image.storage
+        orphan.delete()
+        call_command('gc_media', grace=0, stdout=StringIO())
+        self.assertTrue(storage.exists(kept.image.name))
+        self.assertFalse(storage.exists(orphan_name))
+        self.assertFalse(orphan_thumbnail.exists())
+        self.assertIsNone(thumbnails.lookup(orphan.image, 'card'))
+
+    def test_gc_keeps_reused_orphan(self):
+        """Повторная загрузка осиротевшего файла продлевает ему жизнь."""
+        orphan = self.create_post(self.SMALL_GIF)
+        path = orphan.image.path
+        orphan.delete()
+        os.utime(path, (0, 0))
+        reused = self.create_post(self.SMALL_GIF)
+        Post.objects.filter(pk=reused.pk).delete()
+        call_command('gc_media', stdout=StringIO())
+        self.assertTrue(os.path.exists(path))
+
+    def test_gc_rehash_merges_legacy_files(self):
+        post = self.create_post(self.SMALL_GIF)
+        storage = post.image.storage
+        legacy = 'posts/image_legacy.gif'
+        os.rename(storage.path(post.image.name), storage.path(legacy))
+        Post.objects.filter(pk=post.pk).update(image=legacy)
+        call_command('gc_media', rehash=True, grace=0, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertRegex(post.image.name, r'^posts/[0-9a-f]{64}\.gif$')
+        self.assertTrue(storage.exists(post.image.name))
+        self.assertFalse(storage.exists(legacy))
+
+
+LOAD_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=LOAD_MEDIA_ROOT)
+class GenerateLoadDataTest(TestCase):
+    SIZES = {
+        'users': 30, 'groups': 5, 'posts': 200, 'comments': 300,
+        'follows': 100, 'images': 1, 'batch_size': 70,
+    }
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(LOAD_MEDIA_ROOT, ignore_errors=True)
+
+    def generate(self, prefix, seed=1):
+        call_command('generate_load_data', prefix=prefix, seed=seed,
+                     stdout=StringIO(), **self.SIZES)
+        posts = Post.objects.filter(author__username__startswith=prefix)
+        return {
+            'posts': list(posts.order_by('pk').values_list(
+                'text', 'created', 'image')),
+            'comments': list(Comment.objects.filter(
+                post__in=posts).order_by('pk').values_list(
+                    'text', 'created')),
+            'follows': sorted(Follow.objects.filter(
+                user__username__startswith=prefix
+            ).values_list('user__username', 'author__username')),
+        }
+
+    def test_counts_and_power_law(self):
+        self.generate('load')
+        self.assertEqual(Post.objects.count(), self.SIZES['posts'])
+        self.assertEqual(Comment.objects.count(), self.SIZES['comments'])
+        self.assertEqual(Follow.objects.count(), self.SIZES['follows'])
+        self.assertEqual(Group.objects.count(), self.SIZES['groups'])
+        followers = sorted(
+            AuthorStats.objects.values_list('followers', flat=True),
+            reverse=True,
+        )
+        # Самый популярный автор собирает заметную долю подписок.
+        self.assertGreater(followers[0], 5 * followers[len(followers) // 2])
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertFalse(Comment.objects.filter(
+            created__lt=models.F('post__created')
+        ).exists())
+
+    def test_same_seed_same_data(self):
+        first = self.generate('first')
+        second = self.generate('second')
+        self.assertEqual(first['posts'], second['posts'])
+        self.assertEqual(first['comments'], second['comments'])
+        self.assertEqual(
+            [(user[6:], author[6:]) for user, author in first['follows']],
+            [(user[7:], author[7:]) for user, author in second['follows']],
+        )
+        self.assertNotEqual(self.generate('third', seed=2)['posts'],
+                            first['posts'])
@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.replicas import STICKY_COOKIE
+from ..models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica1', 'replica2'], REPLICA_STICKY_SECONDS=0
+)
+class ReplicaRoutingTest(TestCase):
+    """Реплики — отдельные файлы SQLite. Данные в них кладутся
+    напрямую, чтобы по ответу было видно, откуда шло чтение."""
+    databases = {'default', 'replica1', 'replica2'}
+
+    @classmethod
+    def setUpTestData(cls):
+        for alias in ('default', 'replica1', 'replica2'):
+            # Без сигналов: они пишут в default счётчики и индексы.
+            User.objects.using(alias).bulk_create([
+                User(pk=1, username='author'), User(pk=2, username='reader'),
+            ])
+            Group.objects.using(alias).bulk_create([
+                Group(pk=1, title='Группа', slug='group', description='-'),
+            ])
+            Post.objects.using(alias).bulk_create([
+                Post(pk=1, author_id=1, group_id=1, text=f'Пост {alias}'),
+            ])
+            AuthorStats.objects.using(alias).bulk_create([
+                AuthorStats(author_id=1, posts=1),
+            ])
+        cls.reader = User.objects.get(username='reader')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_reads_go_to_replicas(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=['group']),
+            reverse('posts:profile', args=['author']),
+            reverse('posts:post_detail', args=[1]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                seen = set()
+                for _ in range(20):
+                    cache.clear()
+                    response = self.client.get(url)
+                    seen.update(
+                        alias for alias in ('default', 'replica1',
+                                            'replica2')
+                        if f'Пост {alias}' in response.content.decode()
+                    )
+                self.assertEqual(seen, {'replica1', 'replica2'})
+
+    def test_follow_index_reads_replica(self):
+        for alias in ('replica1', 'replica2'):
+            Follow.objects.using(alias).bulk_create([
+                Follow(user_id=2, author_id=1),
+            ])
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertRegex(response.content.decode(), 'Пост replica[12]')
+
+    @override_settings(REPLICA_STICKY_SECONDS=60)
+    def test_writer_reads_primary_after_write(self):
+        response = self.client.post(
+            reverse('posts:add_comment', args=[1]), {'text': 'Свежий'}
+        )
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(Comment.objects.using('replica1').count(), 0)
+        response = self.client.get(reverse('posts:post_detail', args=[1]))
+        self.assertContains(response, 'Свежий')
+        self.assertContains(response, 'Пост default')
+
+    @override_settings(REPLICA_STICKY_SECONDS=60)
+    def test_recently_changed_page_reads_primary(self):
+        """Другой пользователь тоже не получит отставшую страницу."""
+        Comment.objects.create(post_id=1, author_id=1, text='Свежий')
+        response = Client().get(reverse('posts:post_detail', args=[1]))
+        self.assertContains(response, 'Свежий')
+
+    def test_writes_go_to_primary(self):
+        self.client.post(reverse('posts:post_create'), {'text': 'Новый'})
+        self.assertTrue(Post.objects.filter(text='Новый').exists())
+        for alias in ('replica1', 'replica2'):
+            self.assertFalse(
+                Post.objects.using(alias).filter(text='Новый').exists()
+            )
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        response = self.client.get(reverse('posts:post_detail', args=[1]))
+        self.assertContains(response, 'Пост default')
+        response = self.client.get(
+            reverse('posts:profile_follow', args=['author'])
+        )
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
@@ -0,0 +1,166 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import search, stemmer
+from ..models import Comment, Post, SearchDocument
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    def test_russian_word_forms(self):
+        """Формы слова сводятся к одной основе."""
+        for word, expected in (
+            ('посты', 'пост'),
+            ('постами', 'пост'),
+            ('красивейшая', 'красив'),
+            ('вероятность', 'вероятн'),
+            ('программирование', 'программирован'),
+            ('читала', 'чита'),
+        ):
+            with self.subTest(word=word):
+                self.assertEqual(stemmer.stem(word), expected)
+
+    def test_terms(self):
+        self.assertEqual(
+            stemmer.terms('Ёжики и посты в Django!'),
+            ['ежик', 'пост', 'django'],
+        )
+
+
+class SearchIndexMixin:
+    """Проверки индекса; подклассы выбирают, где он хранится."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.cats = Post.objects.create(
+            author=cls.author, text='Кошки спят на тёплых подоконниках')
+        cls.dogs = Post.objects.create(
+            author=cls.author, text='Собаки гуляют в парке')
+        cls.comment = Comment.objects.create(
+            author=cls.author, post=cls.dogs,
+            text='А моя кошка спала весь день')
+
+    def object_ids(self, model, query, kind):
+        return list(search.filter_queryset(
+            model.objects.all(), query, kind
+        ).values_list('pk', flat=True))
+
+    def test_finds_word_forms_in_posts_and_comments(self):
+        """Пост с совпадением в тексте выше поста с совпадением
+        в комментарии."""
+        self.assertEqual(search.post_ids('кошки'), [
+            self.cats.pk, self.dogs.pk,
+        ])
+        self.assertEqual(
+            self.object_ids(Comment, 'кошка', search.COMMENT),
+            [self.comment.pk],
+        )
+
+    def test_object_ids_match_own_text_only(self):
+        """Для админки: пост без совпадения в своём тексте
+        не находится по комментарию."""
+        self.assertEqual(
+            self.object_ids(Post, 'кошки', search.POST), [self.cats.pk]
+        )
+        self.assertEqual(self.object_ids(Post, 'и в на', search.POST), [])
+
+    def test_all_words_required(self):
+        self.assertEqual(search.post_ids('собаки подоконник'), [])
+        self.assertEqual(search.post_ids('и в на'), [])
+
+    def test_index_follows_changes(self):
+        # Объекты из setUpTestData общие для всех тестов класса.
+        cats = Post.objects.get(pk=self.cats.pk)
+        cats.text = 'Хомяки'
+        cats.save()
+        self.assertEqual(search.post_ids('подоконник'), [])
+        self.assertEqual(search.post_ids('хомяк'), [cats.pk])
+        Comment.objects.get(pk=self.comment.pk).delete()
+        self.assertEqual(
+            self.object_ids(Comment, 'кошки', search.COMMENT), []
+        )
+        Post.objects.get(pk=self.dogs.pk).delete()
+        self.assertEqual(search.post_ids('парк'), [])
+
+    def test_rebuild(self):
+        search.get_index().clear()
+        self.assertEqual(search.post_ids('парк'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('документов 3', out.getvalue())
+        self.assertEqual(search.post_ids('парк'), [self.dogs.pk])
+
+
+class FtsSearchTest(SearchIndexMixin, TestCase):
+    def test_uses_fts5(self):
+        self.assertTrue(search.fts_enabled())
+        self.assertFalse(SearchDocument.objects.exists())
+
+
+@override_settings(POST_SEARCH_BACKEND='python')
+class TableSearchTest(SearchIndexMixin, TestCase):
+    def test_uses_tables(self):
+        self.assertFalse(search.fts_enabled())
+        self.assertEqual(SearchDocument.objects.count(), 3)
+
+
+class SearchViewTest(TestCase):
+    NUM_OF_POSTS = 13
+    POSTS_ON_PAGE = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Другой пост {i}')
+            for i in range(3)
+        )
+        for i in range(cls.NUM_OF_POSTS):
+            Post.objects.create(
+                author=cls.author, text=f'Заметки о Python {i}')
+
+    def test_search_pages(self):
+        url = reverse('posts:search')
+        response = self.client.get(url, {'q': 'заметка'})
+        self.assertTemplateUsed(response, 'posts/search.html')
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, self.NUM_OF_POSTS)
+        self.assertEqual(len(page_obj), self.POSTS_ON_PAGE)
+        response = self.client.get(url, {'q': 'заметка', 'page': 2})
+        self.assertEqual(
+            len(response.context['page_obj']),
+            self.NUM_OF_POSTS - self.POSTS_ON_PAGE
+        )
+        response = self.client.get(url)
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_admin_search_uses_index(self):
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'заметками'})
+        self.assertEqual(
+            response.context['cl'].result_count, self.NUM_OF_POSTS)
+
+    @override_settings(POST_SEARCH_MAX_RESULTS=5)
+    def test_admin_search_not_capped(self):
+        post = Post.objects.get(text='Другой пост 0')
+        Comment.objects.create(
+            author=self.author, post=post, text='Заметки к посту')
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'заметками'})
+        self.assertEqual(
+            response.context['cl'].result_count, self.NUM_OF_POSTS)
+        response = client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'заметками'})
+        self.assertEqual(response.context['cl'].result_count, 1)
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase, Client
 from http import HTTPStatus
 
@@ -25,6 +26,8 @@ class PostURLSTest(TestCase):
         )
 
     def setUp(self):
+        # Закешированная страница отдаётся без шаблонов.
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='HasNoName')
         self.authorized_client = Client()
@@ -1,15 +1,19 @@
+import hashlib
 import shutil
 import tempfile
+from io import StringIO
 
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.urls import reverse
 from django import forms
 
-from ..models import Group, Post, Comment, Follow
+from .. import counters, feeds, generations, metrics, thumbnails
+from ..models import AuthorStats, Group, Post, Comment, FeedEntry, Follow
 
 User = get_user_model()
 
@@ -50,6 +54,10 @@ class PostViewsTest(TestCase):
             content_type='image/gif'
         )
         cls.post_image = uploaded
+        # Картинки хранятся под SHA-256 содержимого.
+        cls.post_image_name = (
+            f'posts/{hashlib.sha256(small_gif).hexdigest()}.gif'
+        )
         cls.post = Post.objects.create(
             author=cls.author,
             group=cls.group,
@@ -105,7 +113,7 @@ class PostViewsTest(TestCase):
         self.assertEqual(post_text, self.post.text)
         self.assertEqual(post_author, self.author)
         self.assertEqual(post_group_slug, self.post.group)
-        self.assertEqual(post_image, f'posts/{self.post_image.name}')
+        self.assertEqual(post_image, self.post_image_name)
 
     def test_index_show_correct_context(self):
         """Шаблон index сформирован с правильным контекстом."""
@@ -219,7 +227,8 @@ class PostViewsTest(TestCase):
         self.assertIn(self.comment, response.context['comments'])
 
     def test_index_cache(self):
-        """Шаблон страницы index хранит записи в кеше"""
+        """Шаблон страницы index хранит записи в кеше,
+        пока данные ленты не изменились."""
         post_cache = Post.objects.create(
             author=self.user,
             text='Тестовый пост для проверки кеша',
@@ -227,12 +236,53 @@ class PostViewsTest(TestCase):
         response = self.authorized_client.get(
             reverse('posts:index')
         )
-        post_cache.delete()
+        # update() не шлёт сигналов, поэтому кеш о нём не знает.
+        Post.objects.filter(pk=post_cache.pk).update(text='Другой текст')
         new_response = self.authorized_client.get(
             reverse('posts:index')
         )
         self.assertEqual(response.content, new_response.content)
 
+    def test_feed_caches_invalidated_by_changes(self):
+        """Кеш лент сбрасывается, когда меняются их посты."""
+        post_cache = Post.objects.create(
+            author=self.author,
+            group=self.group,
+            text='Тестовый пост для проверки кеша',
+        )
+        Follow.objects.create(user=self.user, author=self.author)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        post_cache.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertNotContains(response, post_cache.text)
+
+    def test_post_cards_cached_between_feeds(self):
+        """Карточка поста рендерится один раз для всех лент
+        и обновляется после изменения поста."""
+        self.authorized_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        response = self.authorized_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}))
+        self.assertContains(response, self.post.text)
+        self.assertNotContains(response, 'Новый текст')
+
+        post = Post.objects.get(pk=self.post.pk)
+        post.save()
+        response = self.authorized_client.get(
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}))
+        self.assertContains(response, 'Новый текст')
+
     def test_authorized_user_follow_author(self):
         """Авторизованный пользователь может подписываться
         на других пользователей."""
@@ -286,6 +336,40 @@ class PostViewsTest(TestCase):
         )
         self.assertNotIn(new_post, response.context['page_obj'])
 
+    def test_feed_uses_pregenerated_thumbnail(self):
+        """Шаблон выводит готовую миниатюру, а пока её нет —
+        исходную картинку, и сам миниатюры не строит."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'src="{self.post.image.url}"')
+        self.assertIsNone(thumbnails.lookup(self.post.image, 'card'))
+        self.assertGreater(thumbnails.generate(self.post.image.name), 0)
+        self.assertEqual(thumbnails.generate(self.post.image.name), 0)
+        thumbnail = thumbnails.lookup(self.post.image, 'card')
+        self.assertTrue(thumbnail.url.startswith(settings.MEDIA_URL))
+        cache.clear()
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertContains(response, f'src="{thumbnail.url}"')
+
+    def test_picture_variants(self):
+        """Карточка выводит srcset по ширинам и источники
+        в дополнительных форматах."""
+        with self.settings(POST_CARD_FORMATS=('PNG', 'NOPE')):
+            thumbnails.generate(self.post.image.name)
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<source type="image/png"')
+        self.assertNotContains(response, 'nope')
+        for width in settings.POST_CARD_WIDTHS:
+            with self.subTest(width=width):
+                self.assertContains(response, f'.jpg {width}w')
+                self.assertContains(response, f'.png {width}w')
+
+    def test_warm_thumbnails_command(self):
+        """Команда строит миниатюры для уже загруженных картинок."""
+        call_command('warm_thumbnails', workers=1, stdout=StringIO())
+        self.assertIsNotNone(thumbnails.lookup(self.post.image, 'card'))
+
 
 class PaginatorViewsTest(TestCase):
     NUM_OF_POSTS = 13
@@ -294,6 +378,7 @@ class PaginatorViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
+        cache.clear()
         cls.author = User.objects.create_user(username='test-author')
         cls.author_client = Client()
         cls.author_client.force_login(cls.author)
@@ -335,3 +420,595 @@ class PaginatorViewsTest(TestCase):
                     self.assertEqual(post_text, self.post.text)
                     self.assertEqual(post_author, self.author)
                     self.assertEqual(post_group_slug, self.post.group)
+
+    def test_cursor_pages_follow_each_other(self):
+        """Курсорные ссылки ведут на соседние страницы ленты."""
+        pages_urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author})
+        ]
+        expected = list(Post.objects.order_by('-created', '-pk'))
+        for url in pages_urls:
+            with self.subTest(url=url):
+                cache.clear()
+                first_page = self.client.get(url).context['page_obj']
+                self.assertEqual(list(first_page), expected[:10])
+                next_cursor = str(first_page.next_cursor)
+                second_page = self.client.get(
+                    url, {'cursor': next_cursor}).context['page_obj']
+                self.assertEqual(list(second_page), expected[10:])
+                self.assertFalse(second_page.has_next())
+                self.assertTrue(second_page.has_previous())
+                previous_page = self.client.get(
+                    url, {'cursor': str(second_page.previous_cursor)}
+                ).context['page_obj']
+                self.assertEqual(list(previous_page), expected[:10])
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(len(response.context['page_obj']),
+                         self.NUM_OF_POSTS_ON_PAGES[0])
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов страницы ленты не зависит от числа постов."""
+    NUM_OF_POSTS = 10
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        for i in range(cls.NUM_OF_POSTS):
+            author = User.objects.create_user(username=f'author-{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description='-')
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(author=author, group=group, text='Пост')
+            Post.objects.create(
+                author=cls.author, group=cls.group, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feed_pages_query_budget(self):
+        """Лента из 10 постов укладывается в фиксированное
+        число запросов."""
+        # (клиент, адрес, запросов)
+        feeds = (
+            # Время изменения ленты, COUNT(*) ленты, посты.
+            (self.client, reverse('posts:index'), 3),
+            # Группа, время изменения, COUNT(*) ленты, посты.
+            (self.client, reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}), 4),
+            # Автор, время изменения, статистика автора, посты.
+            (self.client, reverse(
+                'posts:profile', kwargs={'username': self.author}), 4),
+            # Сессия, пользователь, крупные авторы, время изменения,
+            # COUNT(*) ленты, посты.
+            (self.reader_client, reverse('posts:follow_index'), 6),
+        )
+        for client, url, queries in feeds:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = client.get(url)
+                self.assertEqual(
+                    len(response.context['page_obj']), self.NUM_OF_POSTS)
+
+    def test_cached_feed_page_skips_database(self):
+        """Закешированная страница ленты не обращается к БД за постами."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPrefetchTest(TestCase):
+    NUM_OF_POSTS = 10
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        author = User.objects.create_user(username='author')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=author,
+                text='Пост',
+                image=SimpleUploadedFile(
+                    name='small.gif',
+                    content=small_gif,
+                    content_type='image/gif'
+                ),
+            )
+            for _ in range(cls.NUM_OF_POSTS)
+        ]
+        for post in cls.posts:
+            thumbnails.generate(post.image.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_reads_thumbnails_in_one_query(self):
+        """Миниатюры всей страницы читаются одним запросом к БД."""
+        # Время изменения ленты, COUNT(*) ленты, посты, миниатюры.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('posts:index'))
+        for post in self.posts:
+            thumbnail = thumbnails.lookup(post.image, 'card')
+            self.assertContains(response, f'src="{thumbnail.url}"')
+
+    def test_prefetch_marks_missing_thumbnails(self):
+        post = self.posts[0]
+        prefetched = thumbnails.prefetch([post.image], ['card'])
+        self.assertIsNotNone(prefetched[('card', post.image.name)])
+        thumbnails.backend.delete(post.image, delete_file=False)
+        cache.clear()
+        prefetched = thumbnails.prefetch([post.image], ['card'])
+        self.assertIsNone(prefetched[('card', post.image.name)])
+
+
+class CommentListTest(TestCase):
+    NUM_OF_COMMENTS = 25
+    COMMENTS_ON_PAGE = 20
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for i in range(cls.NUM_OF_COMMENTS):
+            commentator = User.objects.create_user(username=f'reader-{i}')
+            Comment.objects.create(
+                author=commentator, post=cls.post, text=f'Комментарий {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.expected = list(
+            self.post.comments.order_by('-created', '-pk'))
+
+    def test_post_detail_shows_first_comments_page(self):
+        """post_detail выводит первую страницу комментариев,
+        не запрашивая автора каждого комментария отдельно."""
+        # Пост с автором, время последнего комментария, статистика
+        # автора, комментарии с авторами.
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                reverse('posts:post_detail',
+                        kwargs={'post_id': self.post.pk}))
+        comments = response.context['comments']
+        self.assertEqual(list(comments),
+                         self.expected[:self.COMMENTS_ON_PAGE])
+        self.assertTrue(comments.has_next())
+
+    def test_comment_list_returns_next_page(self):
+        """comment_list отдаёт следующую страницу по курсору."""
+        first_page = self.client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )).context['comments']
+        url = reverse('posts:comment_list', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url, {'cursor': first_page.next_cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertEqual(list(response.context['comments']),
+                         self.expected[self.COMMENTS_ON_PAGE:])
+        self.assertFalse(response.context['comments'].has_next())
+
+        response = self.client.get(
+            url, {'cursor': first_page.next_cursor, 'format': 'json'})
+        data = response.json()
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.pk for comment in self.expected[
+                self.COMMENTS_ON_PAGE:]]
+        )
+        self.assertIsNone(data['next_cursor'])
+
+
+@override_settings(FEED_FANOUT_ON_WRITE=True, FEED_FANOUT_BATCH_SIZE=2)
+class FanoutFollowFeedTest(TestCase):
+    NUM_OF_FOLLOWERS = 5
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        cls.reader = User.objects.create_user(username='reader')
+        for i in range(cls.NUM_OF_FOLLOWERS):
+            follower = User.objects.create_user(username=f'follower-{i}')
+            Follow.objects.create(user=follower, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def follow_feed(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_new_post_is_written_to_followers_feeds(self):
+        """Новый пост попадает во входящие ленты всех подписчиков."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(
+            FeedEntry.objects.filter(post=post).count(),
+            self.NUM_OF_FOLLOWERS
+        )
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self):
+        """Подписка добавляет посты автора в ленту, отписка убирает."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertEqual(self.follow_feed(), [post])
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.follow_feed(), [])
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader))
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_large_author_posts_are_read_on_request(self):
+        """Посты крупных авторов не раскладываются по лентам,
+        но попадают в ленту подписок при чтении."""
+        Follow.objects.create(user=self.reader, author=self.star)
+        old_post = Post.objects.create(author=self.star, text='Старый')
+        new_post = Post.objects.create(author=self.star, text='Новый')
+        self.assertFalse(FeedEntry.objects.filter(post__author=self.star))
+        self.assertEqual(self.follow_feed(), [new_post, old_post])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_large_author_post_skips_followers_feeds(self):
+        """Пост крупного автора не сдвигает счётчики и поколения лент
+        подписчиков, а лента всё равно показывает его сразу."""
+        Follow.objects.create(user=self.reader, author=self.star)
+        self.assertEqual(self.follow_feed(), [])
+        follower = User.objects.create_user(username='star-follower')
+        Follow.objects.create(user=follower, author=self.star)
+        self.assertTrue(AuthorStats.objects.get(author=self.star).large)
+        feed = counters.follow_feed(self.reader.pk)
+        version = generations.version(feed)
+        post = Post.objects.create(author=self.star, text='Пост')
+        self.assertEqual(generations.version(feed), version)
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_author_stays_large_until_rebuild(self):
+        """Посты, написанные крупным автором, попадают во входящие
+        ленты после rebuild_follow_feeds, когда он снова небольшой."""
+        Follow.objects.create(user=self.reader, author=self.star)
+        post = Post.objects.create(author=self.star, text='Пост')
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=10):
+            self.assertTrue(feeds.is_large_author(self.star.pk))
+            self.assertEqual(self.follow_feed(), [post])
+            call_command('rebuild_follow_feeds', stdout=StringIO())
+            self.assertFalse(feeds.is_large_author(self.star.pk))
+            self.assertTrue(FeedEntry.objects.filter(
+                user=self.reader, post=post
+            ))
+            self.assertEqual(self.follow_feed(), [post])
+
+    def test_rebuild_refreshes_every_follow_feed(self):
+        """После rebuild_follow_feeds ленты подписок не берут
+        счётчик и страницы, посчитанные по старой таблице."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text='Пост')
+        feed = counters.follow_feed(self.reader.pk)
+        self.assertEqual(len(self.follow_feed()), 1)
+        version = generations.version(feed)
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_follow_feeds', stdout=StringIO())
+        self.assertNotEqual(generations.version(feed), version)
+        self.assertIsNone(cache.get(counters.COUNT_KEY.format(feed)))
+        self.assertEqual(len(self.follow_feed()), 1)
+
+
+class ConditionalGetTest(TestCase):
+    """Ленты и посты отвечают 304, пока их данные не менялись."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        # (клиент, адрес, запросов для ответа 304)
+        self.urls = (
+            # Гостю отвечает кеш страниц.
+            (self.client, reverse('posts:index'), 0),
+            (self.client, reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}), 0),
+            (self.client, reverse(
+                'posts:profile', kwargs={'username': self.author}), 0),
+            (self.client, reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}), 0),
+            # Сессия, пользователь, автор.
+            (self.reader_client, reverse(
+                'posts:profile', kwargs={'username': self.author}), 3),
+            # Сессия, пользователь.
+            (self.reader_client, reverse('posts:follow_index'), 2),
+        )
+
+    def test_matching_etag_skips_view(self):
+        """Совпавший ETag даёт 304 без шаблона и без запросов за постами."""
+        for client, url, queries in self.urls:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                self.assertIn('no-cache', response['Cache-Control'])
+                with self.assertNumQueries(queries):
+                    response = client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.templates)
+
+    def test_if_modified_since(self):
+        url = reverse('posts:index')
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_refresh_etag(self):
+        """Новый пост и комментарий меняют ETag своих страниц."""
+        index = reverse('posts:index')
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        index_etag = self.client.get(index)['ETag']
+        detail_etag = self.client.get(detail)['ETag']
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(index, HTTP_IF_NONE_MATCH=index_etag)
+        self.assertEqual(response.status_code, 200)
+        Comment.objects.create(
+            author=self.reader, post=self.post, text='Комментарий')
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Комментарий')
+
+    def test_etag_depends_on_user(self):
+        """Страница гостя не подходит пользователю, и наоборот."""
+        url = reverse('posts:profile', kwargs={'username': self.author})
+        anonymous = self.client.get(url)
+        response = self.reader_client.get(
+            url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_group_rename_refreshes_post_etag(self):
+        """Страница поста показывает название своей группы."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.reader_client.get(url)['ETag']
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Новое название')
+
+    def test_relogin_refreshes_etag(self):
+        """После нового входа форма нужна с новым CSRF-токеном."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.reader_client.get(url)['ETag']
+        self.reader_client.logout()
+        self.reader_client.force_login(self.reader)
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_changes_profile_etag(self):
+        """Подписка меняет кнопку на странице автора."""
+        url = reverse('posts:profile', kwargs={'username': self.author})
+        etag = self.reader_client.get(url)['ETag']
+        Follow.objects.filter(user=self.reader).delete()
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Подписаться')
+
+
+class PageCacheTest(TestCase):
+    """Целые страницы кешируются, фрагменты пользователя — нет."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_guest_page_served_before_view(self):
+        """Гость получает страницу из кеша без запросов и шаблонов."""
+        url = reverse('posts:index')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertFalse(second.templates)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_user_fragments_filled_in(self):
+        """Вошедший пользователь видит свои меню и кнопки
+        в странице, закешированной для другого пользователя."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.author_client.get(url)
+        self.assertContains(response, 'Пользователь: author')
+        self.assertContains(response, 'редактировать запись')
+
+        response = self.reader_client.get(url)
+        templates = [template.name for template in response.templates]
+        self.assertNotIn('posts/post_detail.html', templates)
+        self.assertIn('includes/header.html', templates)
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertNotContains(response, 'Пользователь: author')
+        self.assertNotContains(response, 'редактировать запись')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Пользователь:')
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+        self.assertContains(response, 'Войти')
+
+    def test_follow_button_per_user(self):
+        url = reverse('posts:profile', kwargs={'username': self.author})
+        self.client.get(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(self.reader_client.get(url), 'Отписаться')
+        self.assertContains(self.client.get(url), 'Подписаться')
+        self.assertNotContains(self.author_client.get(url), 'Подписаться')
+
+    def test_new_post_refreshes_page(self):
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, 'posts/index.html')
+        self.assertContains(response, 'Новый пост')
+
+    def test_author_rename_refreshes_pages(self):
+        """Новое имя автора видно в закешированных карточках."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            self.client.get(url)
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Лев'
+        author.last_name = 'Толстой'
+        author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Лев Толстой')
+
+    def test_group_rename_refreshes_post_page(self):
+        """Закешированная страница поста показывает новое название."""
+        group = Group.objects.create(title='Старое название', slug='g')
+        post = Post.objects.create(
+            author=self.author, text='В группе', group=group)
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        self.assertContains(self.client.get(url), 'Старое название')
+        self.assertContains(self.reader_client.get(url), 'Старое название')
+        group.title = 'Новое название'
+        group.save()
+        for client in (self.client, self.reader_client):
+            response = client.get(url)
+            self.assertContains(response, 'Новое название')
+            self.assertNotContains(response, 'Старое название')
+
+    def test_group_slug_rename_refreshes_index(self):
+        """Ссылка «все записи группы» ведёт на новый slug."""
+        group = Group.objects.create(title='Группа', slug='old-slug')
+        Post.objects.create(author=self.author, text='В группе', group=group)
+        url = reverse('posts:index')
+        self.assertContains(self.client.get(url), '/group/old-slug/')
+        group.slug = 'new-slug'
+        group.save()
+        response = self.client.get(url)
+        self.assertContains(response, '/group/new-slug/')
+        self.assertNotContains(response, '/group/old-slug/')
+
+    def test_group_delete_refreshes_index(self):
+        group = Group.objects.create(title='Группа', slug='gone')
+        Post.objects.create(author=self.author, text='В группе', group=group)
+        url = reverse('posts:index')
+        self.assertContains(self.client.get(url), '/group/gone/')
+        group.delete()
+        self.assertNotContains(self.client.get(url), '/group/gone/')
+
+    def test_other_params_skip_cache(self):
+        """Страницы по курсору не кешируются целиком."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        response = self.client.get(url, {'cursor': 'x'})
+        self.assertTemplateUsed(response, 'posts/index.html')
+
+
+class AppMetricsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def total(self, counter, **labels):
+        return counter.snapshot().get(tuple(sorted(labels.items())), 0)
+
+    def test_writes_counted(self):
+        counters = (
+            metrics.POSTS_CREATED, metrics.COMMENTS_CREATED,
+            metrics.FOLLOWS_CREATED,
+        )
+        before = [self.total(counter) for counter in counters]
+        self.client.post(reverse('posts:post_create'), {'text': 'Новый'})
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'},
+        )
+        follow = reverse('posts:profile_follow', args=[self.author])
+        # Повторная подписка новой не считается.
+        self.client.get(follow)
+        self.client.get(follow)
+        after = [self.total(counter) for counter in counters]
+        self.assertEqual(
+            [now - was for was, now in zip(before, after)], [1, 1, 1]
+        )
+
+    def test_fragment_cache_counted(self):
+        hit = {'fragment': 'card', 'result': 'hit'}
+        miss = {'fragment': 'card', 'result': 'miss'}
+        before = self.total(metrics.FRAGMENT_CACHE, **hit)
+        missed = self.total(metrics.FRAGMENT_CACHE, **miss)
+        self.client.get(reverse('posts:profile', args=[self.author]))
+        self.assertEqual(self.total(metrics.FRAGMENT_CACHE, **miss),
+                         missed + 1)
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(self.total(metrics.FRAGMENT_CACHE, **hit),
+                         before + 1)
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(response, 'yatube_fragment_cache_total{')
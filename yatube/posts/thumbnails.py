@@ -0,0 +1,263 @@
+"""Миниатюры картинок постов, которые готовятся заранее.
+
+Размеры перечислены в settings.POST_THUMBNAILS, к ним добавляются
+варианты карточки для <picture>: ширины POST_CARD_WIDTHS в форматах
+POST_CARD_FORMATS и в JPEG. После сохранения поста миниатюры строит
+пул потоков, а шаблоны только читают готовые из хранилища ключей
+sorl-thumbnail и сами картинки не уменьшают.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import generations
+from .metrics import (
+    THUMBNAIL_ERRORS, THUMBNAIL_QUEUE, THUMBNAIL_SECONDS, THUMBNAILS_CREATED,
+)
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+CARD: str = 'card'
+CARD_SIZES: str = '(max-width: 960px) 100vw, 960px'
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'PNG': 'image/png',
+    'JPEG': 'image/jpeg',
+}
+
+_executor = None
+
+
+def available_formats():
+    """Форматы из POST_CARD_FORMATS, которые Pillow умеет сохранять."""
+    Image.init()
+    return [
+        image_format for image_format in settings.POST_CARD_FORMATS
+        if image_format in Image.SAVE and image_format in backend.extensions
+    ]
+
+
+def card_variants():
+    """Варианты карточки: {имя: (формат, ширина, геометрия, опции)}."""
+    geometry, options = settings.POST_THUMBNAILS[CARD]
+    width, height = (int(side) for side in geometry.split('x'))
+    variants = {}
+    for image_format in available_formats() + ['JPEG']:
+        for variant_width in settings.POST_CARD_WIDTHS:
+            variant_height = round(height * variant_width / width)
+            name = f'{CARD}-{variant_width}-{image_format.lower()}'
+            variants[name] = (
+                image_format,
+                variant_width,
+                f'{variant_width}x{variant_height}',
+                {**options, 'format': image_format},
+            )
+    return variants
+
+
+def card_names():
+    return [CARD, *card_variants()]
+
+
+def geometries():
+    found = dict(settings.POST_THUMBNAILS)
+    for name, (_, _, geometry, options) in card_variants().items():
+        found[name] = (geometry, options)
+    return found
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POST_THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """Хранилище ключей sorl-thumbnail с пакетным чтением."""
+
+    def get_many(self, image_files):
+        """Записи для всех image_files: один get_many к кешу
+        и один запрос к БД за тем, чего в кеше нет."""
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        found = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            fetched = {
+                key: stored.get(key, cached_db_kvstore.EMPTY_VALUE)
+                for key in missing
+            }
+            self.cache.set_many(
+                fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            found.update(fetched)
+        return [
+            None if found[key] == cached_db_kvstore.EMPTY_VALUE
+            else deserialize_image_file(found[key])
+            for key in keys
+        ]
+
+
+class PregeneratedBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который умеет искать миниатюру без генерации.
+
+    Знает расширение AVIF, которого нет в sorl-thumbnail.
+    """
+    extensions = {**EXTENSIONS, 'AVIF': 'avif'}
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """ImageFile будущей миниатюры: то же имя, что у get_thumbnail."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = f'{key[:2]}/{key[2:4]}/{key}'
+        extension = self.extensions[options['format']]
+        return f'{sorl_settings.THUMBNAIL_PREFIX}{path}.{extension}'
+
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра из хранилища ключей или None."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options)
+        )
+
+
+backend = PregeneratedBackend()
+
+
+def lookup(image, name):
+    """Готовая миниатюра размера name или None, если её ещё нет."""
+    geometry, options = geometries()[name]
+    return backend.lookup(image, geometry, **options)
+
+
+def prefetch(images, names):
+    """Готовые миниатюры размеров names для целой страницы сразу.
+
+    Возвращает словарь {(размер, имя картинки): миниатюра или None},
+    который теги шаблонов читают вместо хранилища ключей.
+    """
+    images = [image for image in images if image]
+    found = geometries()
+    keys = []
+    files = []
+    for image in images:
+        for name in names:
+            geometry, options = found[name]
+            keys.append((name, image.name))
+            files.append(backend.thumbnail_file(image, geometry, **options))
+    if not files:
+        return {}
+    return dict(zip(keys, default.kvstore.get_many(files)))
+
+
+def picture(image, prefetched=None):
+    """Данные для <picture>: srcset по форматам и запасной JPEG.
+
+    Варианты, которых ещё нет, пропускаются. Пока нет даже миниатюры
+    карточки, выводится исходная картинка.
+    """
+    if prefetched is None:
+        prefetched = prefetch([image], card_names())
+    srcsets = {}
+    for name, (image_format, width, _, _) in card_variants().items():
+        thumbnail = prefetched.get((name, image.name))
+        if thumbnail:
+            srcsets.setdefault(image_format, []).append(
+                f'{thumbnail.url} {width}w'
+            )
+    jpeg = srcsets.pop('JPEG', [])
+    card = prefetched.get((CARD, image.name))
+    return {
+        'sources': [
+            (MIME_TYPES[image_format], ', '.join(srcset))
+            for image_format, srcset in srcsets.items()
+        ],
+        'src': (card or image).url,
+        'srcset': ', '.join(jpeg),
+        'sizes': CARD_SIZES,
+    }
+
+
+def source_file(image_name):
+    """Исходник по имени файла — в хранилище поля Post.image."""
+    return ImageFile(
+        image_name, Post._meta.get_field('image').storage
+    )
+
+
+def generate(image_name):
+    """Строит недостающие миниатюры. Возвращает число новых."""
+    started = time.perf_counter()
+    source = source_file(image_name)
+    created = 0
+    for geometry, options in geometries().values():
+        if backend.lookup(source, geometry, **options):
+            continue
+        backend.get_thumbnail(source, geometry, **options)
+        created += 1
+    if created:
+        THUMBNAIL_SECONDS.observe(time.perf_counter() - started)
+        THUMBNAILS_CREATED.inc(created)
+    return created
+
+
+def _job(image_name, scopes):
+    try:
+        if generate(image_name) and scopes:
+            # Карточки с исходной картинкой больше не нужны.
+            generations.bump(scopes)
+    except Exception:
+        THUMBNAIL_ERRORS.inc()
+        logger.exception('Не удалось построить миниатюры %s', image_name)
+    finally:
+        close_old_connections()
+
+
+def submit(image_name, scopes=()):
+    if not settings.POST_THUMBNAIL_WORKERS:
+        # Без пула строим сразу: так тесты не гоняются с фоновым потоком.
+        _job(image_name, list(scopes))
+        return None
+    THUMBNAIL_QUEUE.inc()
+    future = executor().submit(_job, image_name, list(scopes))
+    future.add_done_callback(lambda _: THUMBNAIL_QUEUE.dec())
+    return future
+
+
+def schedule(post, scopes=()):
+    """Ставит миниатюры поста в очередь после коммита транзакции."""
+    if post.image:
+        image_name = post.image.name
+        transaction.on_commit(lambda: submit(image_name, scopes))
@@ -1,79 +1,127 @@
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 
-from .models import Post, Group, Follow, User
+from core.replicas import replica_reads, sticky_primary
+
+from . import counters, feeds, generations, search
+from .metrics import COMMENTS_CREATED, FOLLOWS_CREATED, POSTS_CREATED
+from .conditional import (
+    conditional_page, follow_page, group_page, index_page, page_object,
+    post_page, profile_page,
+)
+from .models import AuthorStats, Post, Group, Follow, User
 from .forms import PostForm, CommentForm
+from .pagecache import cached_page
+from .paginators import CursorPaginator
 
 
 SLICE: int = 30
 POSTS_ON_PAGE: int = 10
+COMMENTS_ON_PAGE: int = 20
+
 
+def paginator_obj(request, post_list, feed=None, count=None):
+    """Страница ленты: по курсору (?cursor=) или по номеру (?page=).
 
-def paginator_obj(request, post_list):
-    paginator = Paginator(post_list, POSTS_ON_PAGE)
+    Число постов для номеров страниц передаётся в count
+    или берётся из счётчика ленты feed.
+    """
+    cursor = request.GET.get('cursor')
+    if cursor:
+        paginator = CursorPaginator(post_list, POSTS_ON_PAGE)
+        return paginator.cursor_page(cursor)
+    if count is None:
+        count = counters.feed_count(feed, post_list)
+    paginator = CursorPaginator(post_list, POSTS_ON_PAGE, count=count)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
 
+def comments_page(post, cursor=None):
+    """Страница комментариев к посту вместе с их авторами."""
+    comment_list = post.comments.select_related('author').only(
+        'text', 'created', 'post_id', 'author__username'
+    )
+    paginator = CursorPaginator(comment_list, COMMENTS_ON_PAGE)
+    if cursor:
+        return paginator.cursor_page(cursor)
+    return paginator.first_page()
+
+
+@replica_reads
+@conditional_page(index_page)
+@cached_page
 def index(request):
     """Главная страница."""
     template = 'posts/index.html'
     title = 'Это главная страница проекта Yatube'
-    post_list = Post.objects.all()
-    page_obj = paginator_obj(request, post_list)
+    post_list = Post.objects.for_feed()
+    page_obj = paginator_obj(request, post_list, counters.index_feed())
     context = {
         'title': title,
         'page_obj': page_obj,
+        'feed_version': generations.version(counters.index_feed()),
     }
     return render(request, template, context)
 
 
+@replica_reads
+@conditional_page(group_page)
+@cached_page
 def group_posts(request, slug):
     """Страница с записями сообществ."""
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = paginator_obj(request, post_list)
+    group = page_object(request, Group, slug=slug)
+    post_list = group.posts.for_feed()
+    page_obj = paginator_obj(
+        request, post_list, counters.group_feed(group.pk)
+    )
     template = 'posts/group_list.html'
     title = f'Записи сообщества {group.title}'
     context = {
         'title': title,
         'group': group,
         'page_obj': page_obj,
+        'feed_version': generations.version(counters.group_feed(group.pk)),
     }
     return render(request, template, context)
 
 
+@replica_reads
+@conditional_page(profile_page)
+@cached_page
 def profile(request, username):
     """Личная страница пользователя."""
-    users_profile = get_object_or_404(User, username=username)
+    users_profile = page_object(request, User, username=username)
     title = f'Профайл пользователя {username}'
-    post_list = Post.objects.filter(author=users_profile)
-    post_count = post_list.count()
-    page_obj = paginator_obj(request, post_list)
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user,
-        author=users_profile
-    ).exists()
+    post_list = Post.objects.for_feed().filter(author=users_profile)
+    post_count = AuthorStats.objects.for_author(users_profile).posts
+    page_obj = paginator_obj(request, post_list, count=post_count)
     context = {
         'title': title,
         'page_obj': page_obj,
         'author': users_profile,
         'post_count': post_count,
-        'following': following,
+        'feed_version': generations.version(
+            counters.author_feed(users_profile.pk)
+        ),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@replica_reads
+@conditional_page(post_page)
+@cached_page
 def post_detail(request, post_id):
     """Просмотр отдельного поста."""
-    post = get_object_or_404(Post, pk=post_id)
-    post_count = Post.objects.select_related('author').filter(
-        author=post.author
-    ).count()
+    post = page_object(
+        request, Post.objects.select_related('author', 'group'), pk=post_id
+    )
+    post_count = AuthorStats.objects.for_author(post.author_id).posts
     title = f'Пост {post.text[:SLICE]}'
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = comments_page(post)
     context = {
         'title': title,
         'post': post,
@@ -84,7 +132,50 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def comment_list(request, post_id):
+    """Следующие страницы комментариев: HTML-фрагмент или JSON."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = comments_page(post, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+def search_posts(request):
+    """Поиск по текстам постов и комментариев."""
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search.post_ids(query) if query else [],
+                          POSTS_ON_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    posts = Post.objects.for_feed().in_bulk(page_obj.object_list)
+    page_obj.object_list = [
+        posts[pk] for pk in page_obj.object_list if pk in posts
+    ]
+    context = {
+        'title': f'Поиск: {query}' if query else 'Поиск',
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@sticky_primary
 def post_create(request):
     """Создать новый пост."""
     title = 'Новый пост'
@@ -94,6 +185,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        POSTS_CREATED.inc()
         return redirect('posts:profile', post.author.username)
     context = {
         'form': form,
@@ -103,6 +195,7 @@ def post_create(request):
 
 
 @login_required
+@sticky_primary
 def post_edit(request, post_id):
     """Изменение отдельного поста."""
     title = 'Редактировать пост'
@@ -128,6 +221,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@sticky_primary
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -136,30 +230,44 @@ def add_comment(request, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        COMMENTS_CREATED.inc()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@replica_reads
+@conditional_page(follow_page)
 def follow_index(request):
-    post_list = Post.objects.filter(
-        author__following__user=request.user
-    )
-    page_obj = paginator_obj(request, post_list)
+    large_authors = feeds.large_author_ids(request.user)
+    post_list = feeds.follow_feed_posts(request.user, large_authors)
+    feed = counters.follow_feed(request.user.pk)
+    count = counters.feed_count(feed, post_list[0])
+    count += feeds.large_authors_posts(large_authors)
+    page_obj = paginator_obj(request, post_list, count=count)
     context = {
         'page_obj': page_obj,
+        'feed_version': generations.version(
+            *feeds.follow_feed_scopes(request.user, large_authors)
+        ),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@sticky_primary
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        _, created = Follow.objects.get_or_create(
+            user=request.user, author=author
+        )
+        if created:
+            FOLLOWS_CREATED.inc()
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@sticky_primary
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
@@ -50,13 +50,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Замеры запроса первыми: они охватывают всё остальное.
+    'core.timing.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Гости получают закешированные страницы до сессий.
+    'posts.pagecache.PageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -66,7 +70,8 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Шаблоны Django с замером времени рендеринга.
+        'BACKEND': 'core.timing.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -93,6 +98,42 @@ DATABASES = {
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
+# Реплики для чтения лент и постов (core.replicas). replica1 и replica2 —
+# стенды: отдельные файлы SQLite, которые догоняют default командой
+# sync_replicas. Читать из них начинают, когда их алиасы перечислены
+# через запятую в DATABASE_REPLICAS.
+for alias in ('replica1', 'replica2'):
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db_{alias}.sqlite3'),
+        'TEST': {'NAME': os.path.join(BASE_DIR, f'test_{alias}.sqlite3')},
+    }
+# Сколько секунд держать соединение с БД между запросами: 0 — закрывать
+# после каждого запроса. Постоянные соединения экономят открытие файла
+# и PRAGMA на каждом запросе.
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = int(os.getenv('DATABASE_CONN_MAX_AGE', 0))
+# PRAGMA для каждого соединения с SQLite (core.signals). WAL не даёт
+# записи блокировать чтение, busy_timeout (мс) ждёт занятую БД вместо
+# ошибки «database is locked», NORMAL в режиме WAL не теряет
+# целостность, а только последние транзакции при сбое питания.
+SQLITE_PRAGMAS = {
+    # Первым: следующие PRAGMA тоже могут ждать блокировку.
+    'busy_timeout': 5000,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    # Размер страничного кеша в КБ (отрицательное значение) и окно
+    # отображения файла в память в байтах.
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+DATABASE_REPLICAS = [
+    alias for alias in os.getenv('DATABASE_REPLICAS', '').split(',') if alias
+]
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи читать из default: больше отставания реплик.
+REPLICA_STICKY_SECONDS = 5
 
 
 # Password validation
@@ -132,6 +173,9 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# collectstatic даёт файлам имена с хешем и кладёт рядом .gz и .br.
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -145,9 +189,96 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Статику и медиафайлы отдаёт само приложение (core.files).
+SERVE_FILES = True
+
+# Режим кеша: locmem — свой кеш в каждом процессе, file — общий кеш
+# в файлах, socket — общий сервер с протоколом Redis по CACHE_LOCATION.
+# CACHE_LOCAL_TIMEOUT > 0 ставит перед общим кешем локальный кеш
+# процесса (L1) на это число секунд.
+CACHE_MODE = os.getenv('CACHE_MODE', 'locmem')
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '127.0.0.1:6379')
+CACHE_LOCAL_TIMEOUT = int(os.getenv('CACHE_LOCAL_TIMEOUT', 0))
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'core.cache.LocMemCache',
+    },
+    'file': {
+        'BACKEND': 'core.cache.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
+    'socket': {
+        'BACKEND': 'core.cache.RespCache',
+        'LOCATION': CACHE_LOCATION,
+    },
+}
 
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'default': CACHE_BACKENDS[CACHE_MODE],
+}
+if CACHE_LOCAL_TIMEOUT and CACHE_MODE != 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {'LOCAL_TIMEOUT': CACHE_LOCAL_TIMEOUT},
+        },
+        'shared': CACHE_BACKENDS[CACHE_MODE],
     }
+
+# Замеры запросов (core.timing): заголовок Server-Timing, журнал
+# core.timing (медленнее REQUEST_TIMING_SLOW_MS — предупреждение)
+# и доля запросов, попадающих в гистограммы /metrics/.
+REQUEST_TIMING_HEADER = True
+REQUEST_TIMING_SLOW_MS = 500
+REQUEST_TIMING_SLOW_QUERIES = 3
+REQUEST_TIMING_SAMPLE_RATE = 1.0
+# Адреса, которым открыта страница /metrics/.
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+# Каталог для снимков метрик процессов (core.metrics); пустой — у каждого
+# процесса свои метрики. Очищайте его при запуске сервера.
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_SECONDS = 1
+
+# Поиск по постам и комментариям: auto — FTS5, если SQLite его
+# поддерживает, python — инвертированный индекс в обычных таблицах.
+POST_SEARCH_BACKEND = 'auto'
+# Сколько лучших совпадений показывать в поиске.
+POST_SEARCH_MAX_RESULTS = 500
+
+# Сколько секунд хранить целые страницы лент и постов (posts.pagecache).
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+# Сколько секунд живёт счётчик постов ленты (posts.counters). Потом
+# он считается заново, так что расхождение с БД не копится.
+FEED_COUNT_TIMEOUT = 60 * 60
+
+# Лента подписок: при FEED_FANOUT_ON_WRITE новый пост сразу
+# раскладывается по входящим лентам подписчиков.
+FEED_FANOUT_ON_WRITE = False
+# Авторы с большим числом подписчиков остаются на чтении при запросе,
+# а их посты не сдвигают счётчики и поколения лент подписчиков.
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+FEED_FANOUT_BATCH_SIZE = 1000
+# Сколько последних постов автора добавлять в ленту при подписке.
+FEED_BACKFILL_POSTS = 100
+
+# Загружаемые картинки: файлы больше POST_IMAGE_MAX_UPLOAD_SIZE байт
+# не принимаем, больше POST_IMAGE_MAX_PIXELS пикселей — уменьшаем.
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 1920 * 1080
+POST_IMAGE_QUALITY = 85
+
+# Миниатюры картинок постов: имя → (геометрия, опции sorl-thumbnail).
+# Все размеры строятся в фоне после сохранения поста.
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
 }
+# Варианты картинки карточки для <picture>: ширины srcset и форматы
+# сверх JPEG. Форматы, которые Pillow не умеет сохранять, пропускаются.
+POST_CARD_WIDTHS = (480, 960)
+POST_CARD_FORMATS = ('AVIF', 'WEBP')
+# Потоки для миниатюр; 0 — строить сразу после коммита в том же потоке.
+POST_THUMBNAIL_WORKERS = 2
+# Хранилище ключей sorl-thumbnail с пакетным чтением для лент.
+THUMBNAIL_KVSTORE = 'posts.thumbnails.KVStore'